@@ -0,0 +1,242 @@
+#!/bin/env python3.9
+import argparse
+import json
+import platform
+from statistics import median
+from subprocess import DEVNULL, CalledProcessError, check_output
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable, Optional
+
+import numba
+import numpy
+from numpy import arange, array, column_stack, zeros
+from numpy.random import default_rng
+
+from shared import METHODS, Record, Status
+from shared import detect_saccades, detect_saccades_batch, differentiate, differentiate_batch, differentiate_reduce, extract_folder, mse, pair_saccades, read_matlab
+from shared import generate_dataset, matlab_files, saccade_table
+
+STEP = 0.001
+LENGTHS = [1_000, 10_000, 100_000, 1_000_000]
+QUICK_LENGTHS = [1_000, 10_000]
+REPEAT = 5
+# Seconds between saccade onsets of the dense and sparse detector traces
+DENSE_INTERVAL = 0.3
+SPARSE_INTERVAL = 5.0
+SACCADE_AMPLITUDE = 20
+SACCADE_DURATION = 0.1
+
+
+def measure(function: Callable, samples: Optional[int] = None, repeat: int = REPEAT) -> dict:
+    # The first call is reported apart: it pays the cold caches and, for a fresh kernel, the JIT
+    start = perf_counter()
+    function()
+    first = perf_counter() - start
+
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+
+    result = {
+        'first': first,
+        'best': min(times),
+        'median': median(times),
+        'repeat': repeat,
+    }
+    if samples is not None:
+        result['samples_per_second'] = samples / min(times)
+    return result
+
+
+def saccade_trace(samples: int, interval: float, noise: float, seed: int = 0) -> Record:
+    # Minimum jerk saccades alternating between 0 and SACCADE_AMPLITUDE degrees
+    rng = default_rng(seed)
+    width = int(SACCADE_DURATION / STEP)
+    tau = arange(width + 1) / width
+    profile = 10 * tau ** 3 - 15 * tau ** 4 + 6 * tau ** 5
+    speed = 30 * tau ** 2 * (1 - tau) ** 2 / SACCADE_DURATION
+
+    Y0 = zeros(samples)
+    V0 = zeros(samples)
+    level = 0
+    for start in range(int(interval / STEP) // 2, samples - width - 1, int(interval / STEP)):
+        sign = 1 if level == 0 else -1
+        Y0[start:start + width + 1] = level + sign * SACCADE_AMPLITUDE * profile
+        V0[start:start + width + 1] = sign * SACCADE_AMPLITUDE * speed
+        level += sign * SACCADE_AMPLITUDE
+        Y0[start + width + 1:] = level
+
+    return Record(
+        filename='benchmark.mat',
+        angle=SACCADE_AMPLITUDE,
+        noise=noise,
+        h=STEP,
+        status=Status.Healthy,
+        saccades_count=0,
+        threshold=30,
+        X=arange(samples) * STEP,
+        Y=Y0 + rng.normal(0, noise, samples),
+        V0=V0,
+        Y0=Y0
+    )
+
+
+def strided(values: array) -> array:
+    # Records read from .mat files hold strided views, a layout numba compiles apart from contiguous arrays
+    return column_stack([values, values])[:, 0]
+
+
+def jit_benchmarks() -> dict:
+    # Compilation cost of every kernel, measured on tiny inputs before anything else runs
+    record = saccade_trace(1_000, DENSE_INTERVAL, 0.1)
+    results = {'jit/differentiate_batch': measure(lambda: differentiate_batch(record.Y, STEP), repeat=1)}
+
+    velocities = differentiate(record.Y, STEP, 'l11')
+    results['jit/detect_saccades'] = measure(lambda: detect_saccades(velocities, 30, STEP, 0.05), repeat=1)
+
+    stack = differentiate_batch(record.Y, STEP).reshape(len(METHODS), -1)
+    results['jit/detect_saccades_batch'] = measure(lambda: detect_saccades_batch(stack, 30, STEP, 0.05), repeat=1)
+
+    saccades = detect_saccades(velocities, 30, STEP, 0.05)
+    results['jit/saccade_table'] = measure(lambda: saccade_table(saccades, velocities, record.Y), repeat=1)
+    results['jit/mse'] = measure(lambda: mse(record.V0, velocities), repeat=1)
+
+    velocities = strided(velocities)
+    results['jit/detect_saccades/strided'] = measure(lambda: detect_saccades(velocities, 30, STEP, 0.05), repeat=1)
+    results['jit/saccade_table/strided'] = measure(lambda: saccade_table(saccades, velocities, record.Y), repeat=1)
+    results['jit/mse/strided'] = measure(lambda: mse(velocities, record.V0), repeat=1)
+    results['jit/differentiate_reduce'] = measure(
+        lambda: differentiate_reduce(record.Y, record.V0, STEP, METHODS, 30, 0.05),
+        repeat=1
+    )
+
+    return results
+
+
+def kernel_benchmarks(lengths: list[int]) -> dict:
+    results = {}
+    for length in lengths:
+        dense = saccade_trace(length, DENSE_INTERVAL, 0.1)
+        sparse = saccade_trace(length, SPARSE_INTERVAL, 0.1)
+
+        for method in METHODS:
+            results[f'differentiate/{method}/{length}'] = measure(
+                lambda: differentiate(dense.Y, STEP, method),
+                length
+            )
+        results[f'differentiate_batch/{length}'] = measure(
+            lambda: differentiate_batch(dense.Y, STEP),
+            length * len(METHODS)
+        )
+        results[f'differentiate_batch/fft/{length}'] = measure(
+            lambda: differentiate_batch(dense.Y, STEP, engine='fft'),
+            length * len(METHODS)
+        )
+
+        for name, record in (('dense', dense), ('sparse', sparse)):
+            velocities = record.velocities('l11')
+            results[f'saccades/{name}/{length}'] = measure(lambda: record.saccades(velocities), length)
+
+        velocities = dense.velocities('l11')
+        reference = dense.reference_events()
+        detected = dense.saccade_events(velocities)
+        results[f'mse/{length}'] = measure(lambda: mse(dense.V0, velocities), length)
+        results[f'differentiate_reduce/{length}'] = measure(
+            lambda: differentiate_reduce(dense.Y, dense.V0, STEP, METHODS, dense.threshold, 0.05),
+            length * len(METHODS)
+        )
+        results[f'pair_saccades/{length}'] = measure(lambda: pair_saccades(reference, detected), len(reference))
+        results[f'downsampled/{length}'] = measure(lambda: dense._decimated(5), length)
+
+    return results
+
+
+def pipeline_benchmarks(files: int, records: int, samples: int) -> dict:
+    with TemporaryDirectory() as path:
+        generate_dataset(path, records, files, angles=(SACCADE_AMPLITUDE,), statuses=(Status.Healthy,), noises=(0.1,), duration=samples * STEP, seed=0)
+        filenames = matlab_files(path)
+        total = files * records * samples
+
+        return {
+            'read_matlab': measure(lambda: [list(read_matlab(filename)) for filename in filenames], total),
+            'read_matlab/headers': measure(lambda: [list(read_matlab(filename, ())) for filename in filenames]),
+            'extract_folder': measure(lambda: list(extract_folder(path, files=filenames)), total, repeat=2),
+        }
+
+
+def environment() -> dict:
+    try:
+        commit = check_output(['git', 'rev-parse', 'HEAD'], stderr=DEVNULL, text=True).strip()
+    except (CalledProcessError, OSError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'numba': numba.__version__,
+        'machine': platform.machine(),
+        'threads': numba.config.NUMBA_NUM_THREADS,
+    }
+
+
+def compare(baseline_path: str, current_path: str):
+    with open(baseline_path) as file:
+        baseline = json.load(file)['benchmarks']
+    with open(current_path) as file:
+        current = json.load(file)['benchmarks']
+
+    # The JIT entries time the compilation, which only the first call pays
+    print(f'{"Benchmark":<40} {"Timing":>6} {"Baseline":>12} {"Current":>12} {"Ratio":>8}')
+    for name in baseline:
+        if name in current:
+            timing = 'first' if name.startswith('jit/') else 'best'
+            before, after = baseline[name][timing], current[name][timing]
+            print(f'{name:<40} {timing:>6} {before * 1000:>10.3f}ms {after * 1000:>10.3f}ms {after / before:>8.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='DiffExp Benchmarks',
+        description='Time the differentiation kernels, the saccade detector, I/O and the extraction pipeline'
+    )
+
+    parser.add_argument(
+        '-o --output',
+        default='benchmark.json',
+        dest='output',
+        help='JSON file receiving the timings'
+    )
+
+    parser.add_argument(
+        '-q --quick',
+        action='store_true',
+        dest='quick',
+        help='Only time short signals and a small synthetic folder'
+    )
+
+    parser.add_argument(
+        '-c --compare',
+        nargs=2,
+        dest='compare',
+        metavar=('BASELINE', 'CURRENT'),
+        help='Compare two JSON files written by previous runs'
+    )
+
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        benchmarks = jit_benchmarks()
+        benchmarks.update(kernel_benchmarks(QUICK_LENGTHS if args.quick else LENGTHS))
+        benchmarks.update(pipeline_benchmarks(*((2, 4, 6_000) if args.quick else (12, 4, 60_000))))
+
+        with open(args.output, 'w') as file:
+            json.dump({'environment': environment(), 'benchmarks': benchmarks}, file, indent=1)
+
+        for name, result in benchmarks.items():
+            print(f'{name:<40} {result["best"] * 1000:>10.3f}ms  first {result["first"] * 1000:>10.3f}ms')
@@ -2,82 +2,219 @@
 
 import argparse
 from os.path import dirname, join
+from typing import Optional
 
 from matplotlib import pyplot as plt
 from matplotlib import use as use_backend
-from pandas import DataFrame, read_pickle
+from numpy import abs as absolute, linspace, pi
+from pandas import concat, read_pickle
 from pyperclip import copy
 from tqdm import tqdm
 
-from shared import METHODS
-from shared import DFLine, Metric, Status, iterate_matlab_folder, read_matlab
+from shared import CENTRAL_DIFFERENCES, ENGINES, METHODS, frequency_response
+from shared import DFBlock, Metric, Status, iterate_matlab_folder, read_matlab
+from shared import DataIndex, RecordQuery, ShardStore, generate_dataset, record_query
+from shared import PROFILER, warm_kernels
+from shared import EXACT_SACCADES_COLUMNS, extract_folder, extract_store, write_store
+from shared import METRIC_KEYS, ResultsWriter, columns_dataframe, read_results
+from shared import bootstrap_ranking, metric_tests
+from shared import DesignProblem, fitted_differentiator, register_method, search_differentiators
+from shared.stats import CORRECTIONS
 
 DATA_PATH = join(dirname(dirname(__file__)), 'data')
+STORE_PATH = join(DATA_PATH, 'store')
+RESULTS_PATH = join(DATA_PATH, 'results.h5')
+SHARDS_PATH = join(DATA_PATH, 'shards')
+SYNTHETIC_PATH = join(DATA_PATH, 'synthetic')
+PROFILE_PATH = join(DATA_PATH, 'profile.json')
 ANGLES = [20, 30, 60]
+DESIGN_RADII = range(2, 9)
+# Squared velocity units, the white noise variance the fitted filter should be robust against
+DESIGN_PENALTIES = (0, 10, 100, 1_000, 10_000)
+
+
+def downsample_factors(value: str) -> list[int]:
+    factors = [int(factor) for factor in value.split(',')]
+    if any(factor < 1 for factor in factors):
+        raise argparse.ArgumentTypeError(f'downsampling factors must be positive integers, got {value}')
+    return factors
+
+
+def extract_results(
+    metrics: set[Metric],
+    exact_saccades: bool,
+    jobs: int,
+    store: bool,
+    factors: list[int] = (5,),
+    files: Optional[list[str]] = None,
+    engine: str = 'stencil',
+    shards: Optional[ShardStore] = None
+):
+    if store:
+        return extract_store(STORE_PATH, factors, metrics, exact_saccades, jobs, engine=engine)
+    return extract_folder(DATA_PATH, factors, metrics, exact_saccades, jobs, files, shards, engine)
+
+
+def build_store():
+    pbar = tqdm(iterate_matlab_folder(DATA_PATH))
+    count = write_store(pbar, STORE_PATH)
 
+    print(f'{count} records stored in "{STORE_PATH}"')
 
-def extract_mse_dataframe():
-    lines = []
 
-    pbar = tqdm(iterate_matlab_folder(DATA_PATH))
-    for record in pbar:
-        pbar.set_description(f'Extracting MSE from "{record.filename}"')
-        downsampled = record.downsampled(5)
-        for line in downsampled.mse_lines():
-            lines.append(line.df_row)
-
-    df = DataFrame(
-        lines,
-        columns=DFLine.columns(Metric.MSE)
-    )
+def generate_synthetic(files_per_condition: int, store: bool = False):
+    path = join(SYNTHETIC_PATH, 'store') if store else SYNTHETIC_PATH
+    count = generate_dataset(path, files_per_condition=files_per_condition)
 
-    df.to_pickle(join(DATA_PATH, 'mse.pkl.xz'), compression='infer')
+    print(f'{count} synthetic records written to "{path}"')
 
 
-def extract_biomarkers_dataframes():
-    peak_velocity_lines = []
-    duration_lines = []
-    latency_lines = []
+def extract_mse_dataframe(jobs: int = 1, store: bool = False, files: Optional[list[str]] = None, engine: str = 'stencil', shards: Optional[ShardStore] = None):
+    chunks = []
 
-    pbar = tqdm(iterate_matlab_folder(DATA_PATH))
-    for record in pbar:
-        pbar.set_description(f'Extracting biomarkers from "{record.filename}"')
-        downsampled = record.downsampled(5)
-        for line in downsampled.peak_velocity_lines():
-            peak_velocity_lines.append(line.df_row)
-
-        for line in downsampled.time_lines():
-            if line.metric == Metric.Latency:
-                latency_lines.append(line.df_row)
-            elif line.metric == Metric.Duration:
-                duration_lines.append(line.df_row)
-
-    peak_velocity_df = DataFrame(
-        peak_velocity_lines,
-        columns=DFLine.columns(Metric.PeakVelocity)
-    )
+    pbar = tqdm(extract_results({Metric.MSE}, False, jobs, store, files=files, engine=engine, shards=shards))
+    for results in pbar:
+        pbar.set_description(f'Extracting MSE from "{results.filename}"')
+        chunks.append(results.blocks[Metric.MSE].columns())
 
-    peak_velocity_df.to_pickle(join(DATA_PATH, 'peak_velocities.pkl.xz'), compression='infer')
+    df = columns_dataframe(chunks, DFBlock.column_names(Metric.MSE))
 
-    latency_df = DataFrame(
-        latency_lines,
-        columns=DFLine.columns(Metric.Latency)
-    )
+    with PROFILER.stage('serialize'):
+        df.to_pickle(join(DATA_PATH, 'mse.pkl.xz'), compression='infer')
 
-    latency_df.to_pickle(join(DATA_PATH, 'latencies.pkl.xz'), compression='infer')
 
-    durations_df = DataFrame(
-        duration_lines,
-        columns=DFLine.columns(Metric.Duration)
-    )
+def extract_biomarkers_dataframes(jobs: int = 1, store: bool = False, files: Optional[list[str]] = None, engine: str = 'stencil', shards: Optional[ShardStore] = None):
+    peak_velocity_chunks = []
+    duration_chunks = []
+    latency_chunks = []
+
+    metrics = {Metric.PeakVelocity, Metric.Duration, Metric.Latency}
+    pbar = tqdm(extract_results(metrics, False, jobs, store, files=files, engine=engine, shards=shards))
+    for results in pbar:
+        pbar.set_description(f'Extracting biomarkers from "{results.filename}"')
+        peak_velocity_chunks.append(results.blocks[Metric.PeakVelocity].columns())
+        latency_chunks.append(results.blocks[Metric.Latency].columns())
+        duration_chunks.append(results.blocks[Metric.Duration].columns())
+
+    peak_velocity_df = columns_dataframe(peak_velocity_chunks, DFBlock.column_names(Metric.PeakVelocity))
+
+    with PROFILER.stage('serialize'):
+        peak_velocity_df.to_pickle(join(DATA_PATH, 'peak_velocities.pkl.xz'), compression='infer')
 
-    durations_df.to_pickle(join(DATA_PATH, 'durations.pkl.xz'), compression='infer')
+    latency_df = columns_dataframe(latency_chunks, DFBlock.column_names(Metric.Latency))
 
+    with PROFILER.stage('serialize'):
+        latency_df.to_pickle(join(DATA_PATH, 'latencies.pkl.xz'), compression='infer')
 
-def describe_data():
+    durations_df = columns_dataframe(duration_chunks, DFBlock.column_names(Metric.Duration))
+
+    with PROFILER.stage('serialize'):
+        durations_df.to_pickle(join(DATA_PATH, 'durations.pkl.xz'), compression='infer')
+
+
+def extract_all(
+    jobs: int = 1,
+    store: bool = False,
+    factors: list[int] = (5,),
+    files: Optional[list[str]] = None,
+    engine: str = 'stencil',
+    shards: Optional[ShardStore] = None
+):
+    data = empty_records_distribution()
     saccades = []
 
-    data = {
+    with ResultsWriter(RESULTS_PATH) as writer:
+        pbar = tqdm(extract_results(set(Metric), True, jobs, store, factors, files, engine, shards))
+        for results in pbar:
+            pbar.set_description(f'Extracting all metrics from "{results.filename}" (factor {results.factor})')
+
+            with PROFILER.stage('serialize'):
+                for metric, block in results.blocks.items():
+                    writer.append(METRIC_KEYS[metric], block.columns())
+                writer.append('exact_saccades', results.exact_saccades)
+
+            if results.factor == factors[0]:
+                data[results.status][results.angle] += 1
+                saccades.append(results.saccades_count)
+
+    print(f'Results written to "{RESULTS_PATH}"')
+    print_records_distribution(data, saccades)
+
+
+def hypothesis_tests(jobs: int = 1, correction: str = 'holm'):
+    friedman_tables = []
+    wilcoxon_tables = []
+
+    for metric, key in METRIC_KEYS.items():
+        df = read_results(RESULTS_PATH, key)
+        for factor, group in df.groupby('Factor', sort=False):
+            friedman, wilcoxon = metric_tests(group, metric.name, correction, jobs=jobs)
+            for table, tables in ((friedman, friedman_tables), (wilcoxon, wilcoxon_tables)):
+                table.insert(0, 'Factor', factor)
+                table.insert(0, 'Metric', metric.name)
+                tables.append(table)
+
+    friedman_df = concat(friedman_tables, ignore_index=True)
+    wilcoxon_df = concat(wilcoxon_tables, ignore_index=True)
+
+    friedman_df.to_pickle(join(DATA_PATH, 'friedman.pkl.xz'), compression='infer')
+    wilcoxon_df.to_pickle(join(DATA_PATH, 'wilcoxon.pkl.xz'), compression='infer')
+
+    print(friedman_df.to_string(index=False))
+    print()
+    print(wilcoxon_df.groupby(['Metric', 'Factor'], sort=False)['different'].agg(['sum', 'count']).to_string())
+
+
+def bootstrap_intervals(jobs: int = 1, resamples: int = 10_000):
+    tables = []
+
+    for metric, key in METRIC_KEYS.items():
+        df = read_results(RESULTS_PATH, key)
+        for factor, group in df.groupby('Factor', sort=False):
+            table = bootstrap_ranking(group, metric.name, resamples, jobs=jobs)
+            table.insert(0, 'Factor', factor)
+            table.insert(0, 'Metric', metric.name)
+            tables.append(table)
+
+    bootstrap_df = concat(tables, ignore_index=True)
+    bootstrap_df.to_pickle(join(DATA_PATH, 'bootstrap.pkl.xz'), compression='infer')
+
+    for (metric, factor), table in bootstrap_df.groupby(['Metric', 'Factor'], sort=False):
+        print(f'Absolute {metric} error, factor {factor}, {resamples} resamples')
+        print(table.drop(columns=['Metric', 'Factor']).to_string(index=False, float_format='%.4f'))
+        print()
+
+
+def fit_differentiator(files: list[str], factor: int = 5):
+    # Alternate files train and validate, so that no record of a validation file is seen by the fit
+    radius = max(DESIGN_RADII)
+    training = DesignProblem.empty(radius)
+    validation = DesignProblem.empty(radius)
+
+    files = sorted(files)
+    for index, filename in enumerate(tqdm(files, desc='Building design matrices')):
+        problem = DesignProblem.from_records((record.downsampled(factor) for record in read_matlab(filename)), radius)
+        if index % 2 == 0 or len(files) == 1:
+            training += problem
+        else:
+            validation += problem
+
+    if validation.samples == 0:
+        validation = training
+
+    df = search_differentiators(training, validation, DESIGN_RADII, DESIGN_PENALTIES)
+    df.to_pickle(join(DATA_PATH, 'design.pkl.xz'), compression='infer')
+
+    best = df.iloc[0]
+    method = f'fit{best.Points}'
+    register_method(method, fitted_differentiator(best.Coefficients))
+
+    print(df.drop(columns='Coefficients').head(10).to_string(index=False))
+    print(f'Registered "{method}" (penalty {best.Penalty}), validation MSE {best.ValidationMSE:.4f}')
+
+
+def empty_records_distribution() -> dict[Status, dict[int, int]]:
+    return {
         status: {
             angle: 0
             for angle in ANGLES
@@ -85,12 +222,21 @@ def describe_data():
         for status in Status
     }
 
-    pbar = tqdm(iterate_matlab_folder(DATA_PATH))
-    for record in pbar:
-        pbar.set_description(f'Processing {record.filename}')
-        data[record.status][record.angle] += 1
-        saccades.append(record.saccades_count)
 
+def describe_data(index: DataIndex, query: Optional[RecordQuery] = None):
+    saccades = []
+
+    data = empty_records_distribution()
+
+    # Every record of a file shares its metadata, the index already holds it
+    for entry in index.query(query):
+        data[entry.status][entry.angle] += entry.records
+        saccades.extend([entry.saccades_count] * entry.records)
+
+    print_records_distribution(data, saccades)
+
+
+def print_records_distribution(data: dict[Status, dict[int, int]], saccades: list[int]):
     params = []
     total = 0
     for status in Status:
@@ -135,30 +281,17 @@ def describe_data():
     print(f'Saccades Count: {sum(saccades)}')
 
 
-def exact_saccades_stats():
-    saccades = []
-    pbar = tqdm(iterate_matlab_folder(DATA_PATH))
-    for record in pbar:
-        pbar.set_description(f'Processing {record.filename}')
-
-        downsampled = record.downsampled(5)
+def exact_saccades_stats(jobs: int = 1, store: bool = False, files: Optional[list[str]] = None, engine: str = 'stencil', shards: Optional[ShardStore] = None):
+    chunks = []
+    pbar = tqdm(extract_results(set(), True, jobs, store, files=files, engine=engine, shards=shards))
+    for results in pbar:
+        pbar.set_description(f'Processing {results.filename}')
+        chunks.append(results.exact_saccades)
 
-        for onset, offset in downsampled.saccades(downsampled.V0):
-            saccades.append([
-                downsampled.status.value,
-                downsampled.angle,
-                downsampled.noise,
-                (offset - onset) * downsampled.h,
-                max(abs(downsampled.V0[onset:offset]))
-            ])
+    saccades_df = columns_dataframe(chunks, EXACT_SACCADES_COLUMNS)
 
-
-    saccades_df = DataFrame(
-        saccades,
-        columns=['Status', 'Angle', 'Noise', 'Duration', 'PeakVelocity']
-    )
-
-    saccades_df.to_pickle(join(DATA_PATH, 'exact_saccades.pkl.xz'), compression='infer')
+    with PROFILER.stage('serialize'):
+        saccades_df.to_pickle(join(DATA_PATH, 'exact_saccades.pkl.xz'), compression='infer')
 
     print('Job completed')
 
@@ -240,8 +373,8 @@ def figure_cd_vs_sl():
     plt.show()
 
 
-def detected_saccades_analysis():
-    df_lines = []
+def detected_saccades_analysis(jobs: int = 1, store: bool = False, files: Optional[list[str]] = None, engine: str = 'stencil', shards: Optional[ShardStore] = None):
+    chunks = []
 
     stats = {
         method: {
@@ -249,32 +382,30 @@ def detected_saccades_analysis():
             'overidentified': 0,
         }
         for method in METHODS.keys()
-        if method not in {'cd3', 'cd5', 'cd7', 'cd9'}
+        if method not in CENTRAL_DIFFERENCES
     }
 
-    pbar = tqdm(iterate_matlab_folder(DATA_PATH))
-    for record in pbar:
-        pbar.set_description(f'Processing {record.filename}')
-        downsampled = record.downsampled(5)
+    pbar = tqdm(extract_results({Metric.DetectedSaccades}, False, jobs, store, files=files, engine=engine, shards=shards))
+    for results in pbar:
+        pbar.set_description(f'Processing {results.filename}')
 
-        for line in downsampled.detected_saccades_lines():
-            df_lines.append(line.df_row)
+        block = results.blocks[Metric.DetectedSaccades]
+        chunks.append(block.columns())
 
-            if line.value < 0:
-                stats[line.method]['unidentified'] += int(line.value)
-            elif line.value > 0:
-                stats[line.method]['overidentified'] += int(line.value)
+        for method, value in zip(block.methods.tolist(), block.values.tolist()):
+            if value < 0:
+                stats[method]['unidentified'] += int(value)
+            elif value > 0:
+                stats[method]['overidentified'] += int(value)
 
-    df = DataFrame(
-        df_lines,
-        columns=DFLine.columns(Metric.DetectedSaccades)
-    )
+    df = columns_dataframe(chunks, DFBlock.column_names(Metric.DetectedSaccades))
 
     filename = 'detected_saccades.pkl.xz'
-    df.to_pickle(
-        join(DATA_PATH, filename),
-        compression='infer'
-    )
+    with PROFILER.stage('serialize'):
+        df.to_pickle(
+            join(DATA_PATH, filename),
+            compression='infer'
+        )
 
     print(f'Filename: "{filename}" generated')
 
@@ -355,6 +486,32 @@ def biomarkers_boxplot():
     plt.show()
 
 
+def figure_frequency_responses():
+    use_backend('Qt5Agg')
+
+    frequencies = linspace(0, pi, 1_000)
+    responses = absolute(frequency_response(frequencies))
+
+    plt.rcParams['figure.figsize'] = (8, 6)
+
+    plt.plot(frequencies / pi, frequencies, 'k--', label='Ideal')
+    for method, response in zip(METHODS, responses):
+        plt.plot(frequencies / pi, response, label=method)
+    plt.title('Amplitude response')
+    plt.xlabel('Normalized frequency ($\\times \\pi$ rad/sample)')
+    plt.ylabel('Gain')
+    plt.legend(ncol=2, fontsize='small')
+
+    plt.tight_layout()
+    plt.savefig('../article/figures/frequency_responses.eps', format='eps')
+
+    print(f'{"Method":<8} {"Noise gain":>12}')
+    for method, differentiator in METHODS.items():
+        print(f'{method:<8} {differentiator.noise_gain:>12.6f}')
+
+    plt.show()
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         prog='DiffExp',
@@ -373,6 +530,12 @@ if __name__ == '__main__':
         dest='extract_biomarkers_dataframes',
         help='Generate all data frames'
     )
+    parser.add_argument(
+        '-all --extract-all',
+        action='store_true',
+        dest='extract_all',
+        help='Extract every metric table into results.h5 and show the data distribution in a single pass'
+    )
     parser.add_argument(
         '-dd --describe-data',
         action='store_true',
@@ -414,24 +577,208 @@ if __name__ == '__main__':
         help='Show biomarkers calculation errors boxplot'
     )
 
+    parser.add_argument(
+        '-ffr --figure-frequency-responses',
+        action='store_true',
+        dest='figure_frequency_responses',
+        help='Show every method amplitude response and print its white noise gain'
+    )
+
+    parser.add_argument(
+        '-j --jobs',
+        type=int,
+        default=1,
+        dest='jobs',
+        help='Number of worker processes used by the extraction commands (-1 uses every core)'
+    )
+
+    parser.add_argument(
+        '-df --downsample-factors',
+        type=downsample_factors,
+        default=[5],
+        dest='downsample_factors',
+        help='Comma separated downsampling factors swept by --extract-all, e.g. 1,2,3,5,10'
+    )
+
+    parser.add_argument(
+        '-de --differentiation-engine',
+        choices=ENGINES,
+        default='stencil',
+        dest='engine',
+        help='Differentiate with the compiled stencils or with one FFT per record for every method'
+    )
+
+    parser.add_argument(
+        '-ns --no-shards',
+        action='store_true',
+        dest='no_shards',
+        help='Extract every .mat file without reading or writing the per-file result shards'
+    )
+
+    parser.add_argument(
+        '-rs --rebuild-shards',
+        action='store_true',
+        dest='rebuild_shards',
+        help='Extract every .mat file again and overwrite its result shard'
+    )
+
+    parser.add_argument(
+        '-bs --build-store',
+        action='store_true',
+        dest='build_store',
+        help='Convert the .mat files into the memory-mapped record store'
+    )
+
+    parser.add_argument(
+        '-s --store',
+        action='store_true',
+        dest='store',
+        help='Read records from the memory-mapped store instead of the .mat files'
+    )
+
+    parser.add_argument(
+        '-gs --generate-synthetic',
+        type=int,
+        dest='generate_synthetic',
+        help='Write this many synthetic .mat files per angle, status and noise level (into a store with --store)'
+    )
+
+    parser.add_argument(
+        '-fa --filter-angles',
+        type=lambda value: [int(angle) for angle in value.split(',')],
+        dest='angles',
+        help='Only process records with these comma separated angles, e.g. 20,60'
+    )
+
+    parser.add_argument(
+        '-fs --filter-statuses',
+        type=lambda value: [Status[status.capitalize()] for status in value.split(',')],
+        dest='statuses',
+        help='Only process records with these comma separated statuses: healthy, sick'
+    )
+
+    parser.add_argument(
+        '-fn --filter-noises',
+        type=lambda value: [float(noise) for noise in value.split(',')],
+        dest='noises',
+        help='Only process records with these comma separated noise levels, e.g. 0.1,0.5'
+    )
+
+    parser.add_argument(
+        '-ht --hypothesis-tests',
+        action='store_true',
+        dest='hypothesis_tests',
+        help='Run Friedman and pairwise Wilcoxon tests on every metric table of results.h5'
+    )
+
+    parser.add_argument(
+        '-mc --multiple-comparisons',
+        choices=CORRECTIONS,
+        default='holm',
+        dest='correction',
+        help='Correction applied to the pairwise Wilcoxon p-values'
+    )
+
+    parser.add_argument(
+        '-bci --bootstrap-intervals',
+        action='store_true',
+        dest='bootstrap_intervals',
+        help='Bootstrap confidence intervals of every method mean absolute error and rank in results.h5'
+    )
+
+    parser.add_argument(
+        '-br --bootstrap-resamples',
+        type=int,
+        default=10_000,
+        dest='bootstrap_resamples',
+        help='Number of bootstrap resamples'
+    )
+
+    parser.add_argument(
+        '-fd --fit-differentiator',
+        action='store_true',
+        dest='fit_differentiator',
+        help='Fit a least squares differentiator to V0 at the first downsampling factor and add it to the methods of the other commands'
+    )
+
+    parser.add_argument(
+        '-p --profile',
+        action='store_true',
+        dest='profile',
+        help='Time every pipeline stage, print a summary and write a Chrome trace to profile.json'
+    )
+
     args = parser.parse_args()
 
+    if args.profile:
+        if args.jobs != 1:
+            print('Profiling runs the extraction in this process, ignoring --jobs')
+            args.jobs = 1
+        # Compiled before the timers start, the stages would otherwise include the JIT
+        warm_kernels(args.downsample_factors, args.engine)
+        PROFILER.enable()
+
+    query = record_query(args.angles, args.statuses, args.noises)
+    if query is not None and args.store:
+        parser.error('record filters are resolved through the .mat index and cannot be combined with --store')
+
+    if args.no_shards and args.rebuild_shards:
+        parser.error('--no-shards and --rebuild-shards are mutually exclusive')
+
+    # The index and the shards of the .mat folder are opened once, and only by the commands that read it
+    extracts_folder = not args.store and any((
+        args.extract_mse_dataframe,
+        args.extract_biomarkers_dataframes,
+        args.extract_all,
+        args.exact_saccades_stats,
+        args.detected_saccades_analysis,
+    ))
+    index = None
+    if args.describe_data or args.fit_differentiator or extracts_folder:
+        index = DataIndex(DATA_PATH)
+    files = None if index is None else index.files(query)
+    shards = ShardStore(SHARDS_PATH, args.rebuild_shards) if extracts_folder and not args.no_shards else None
+
     option_count = 0
 
+    if args.generate_synthetic:
+        generate_synthetic(args.generate_synthetic, args.store)
+        option_count += 1
+
+    if args.build_store:
+        build_store()
+        option_count += 1
+
+    if args.fit_differentiator:
+        fit_differentiator(files, args.downsample_factors[0])
+        option_count += 1
+
     if args.extract_mse_dataframe:
-        extract_mse_dataframe()
+        extract_mse_dataframe(args.jobs, args.store, files, args.engine, shards)
         option_count += 1
 
     if args.extract_biomarkers_dataframes:
-        extract_biomarkers_dataframes()
+        extract_biomarkers_dataframes(args.jobs, args.store, files, args.engine, shards)
+        option_count += 1
+
+    if args.extract_all:
+        extract_all(args.jobs, args.store, args.downsample_factors, files, args.engine, shards)
+        option_count += 1
+
+    if args.hypothesis_tests:
+        hypothesis_tests(args.jobs, args.correction)
+        option_count += 1
+
+    if args.bootstrap_intervals:
+        bootstrap_intervals(args.jobs, args.bootstrap_resamples)
         option_count += 1
 
     if args.describe_data:
-        describe_data()
+        describe_data(index, query)
         option_count += 1
 
     if args.exact_saccades_stats:
-        exact_saccades_stats()
+        exact_saccades_stats(args.jobs, args.store, files, args.engine, shards)
         option_count += 1
 
     if args.figure_3cd_vs_5cd:
@@ -443,12 +790,22 @@ if __name__ == '__main__':
         option_count += 1
 
     if args.detected_saccades_analysis:
-        detected_saccades_analysis()
+        detected_saccades_analysis(args.jobs, args.store, files, args.engine, shards)
         option_count += 1
 
     if args.biomarkers_boxplot:
         biomarkers_boxplot()
         option_count += 1
 
+    if args.figure_frequency_responses:
+        figure_frequency_responses()
+        option_count += 1
+
     if option_count == 0:
         parser.print_help()
+
+    if args.profile:
+        PROFILER.disable()
+        print(PROFILER.summary())
+        PROFILER.save(PROFILE_PATH)
+        print(f'Profile written to "{PROFILE_PATH}"')
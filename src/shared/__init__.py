@@ -1,18 +1,112 @@
-from .dataclasses import DFLine, Record
-from .differentiation import METHODS, differentiate
+from .dataclasses import DFBlock, DFLine, LazyRecord, Record
+from .design import DesignProblem, fitted_differentiator, noise_gain, search_differentiators
+from .differentiation import (
+    CENTRAL_DIFFERENCES,
+    ENGINES,
+    METHODS,
+    Differentiator,
+    central_difference,
+    differentiate,
+    differentiate_batch,
+    differentiate_chunked,
+    differentiate_stream,
+    frequency_response,
+    lanczos,
+    register_method,
+    smooth_noise_robust,
+    super_lanczos,
+)
 from .enums import Status, Metric
-from .io import iterate_matlab_folder, read_matlab
+from .fused import differentiate_reduce
+from .index import DataIndex, IndexEntry, RecordQuery, record_query
+from .io import MatlabFile, iterate_matlab_folder, matlab_files, read_matlab, write_matlab
+from .lru import SIGNAL_CACHE, CacheScope, SignalCache
 from .math import mse
+from .online import OnlineDifferentiator, OnlineEngine, OnlineSaccadeDetector
+from .profiling import PROFILER, Profiler
+from .pipeline import EXACT_SACCADES_COLUMNS, RecordResults, extract_file, extract_folder, extract_record, extract_store, warm_kernels
+from .results import METRIC_KEYS, ResultsWriter, columns_dataframe, read_results
+from .saccades import MIN_DURATIONS, SACCADE_DTYPE, detect_saccades, detect_saccades_batch, pair_saccades, saccade_table
+from .shards import ShardStore, content_hash, parameters_fingerprint
+from .stats import adjust_pvalues, block_means, bootstrap_ranking, friedman_test, method_matrix, metric_tests, pairwise_wilcoxon
+from .store import iterate_store, write_store
+from .synthetic import generate_dataset, synthetic_records, synthetic_signals
 
 
 __all__ = [
+    'CENTRAL_DIFFERENCES',
+    'CacheScope',
+    'DFBlock',
     'DFLine',
+    'Differentiator',
+    'DataIndex',
+    'DesignProblem',
+    'ENGINES',
+    'EXACT_SACCADES_COLUMNS',
+    'IndexEntry',
+    'LazyRecord',
     'METHODS',
+    'METRIC_KEYS',
+    'MIN_DURATIONS',
+    'MatlabFile',
     'Metric',
+    'OnlineDifferentiator',
+    'OnlineEngine',
+    'OnlineSaccadeDetector',
+    'PROFILER',
+    'Profiler',
     'Record',
+    'RecordQuery',
+    'SACCADE_DTYPE',
+    'SIGNAL_CACHE',
+    'RecordResults',
+    'ResultsWriter',
+    'ShardStore',
+    'SignalCache',
     'Status',
+    'adjust_pvalues',
+    'block_means',
+    'bootstrap_ranking',
+    'central_difference',
+    'columns_dataframe',
+    'content_hash',
+    'detect_saccades',
+    'detect_saccades_batch',
     'differentiate',
+    'differentiate_batch',
+    'differentiate_chunked',
+    'differentiate_reduce',
+    'differentiate_stream',
+    'extract_file',
+    'extract_folder',
+    'extract_record',
+    'extract_store',
+    'fitted_differentiator',
+    'frequency_response',
+    'friedman_test',
+    'generate_dataset',
     'iterate_matlab_folder',
+    'iterate_store',
+    'lanczos',
+    'matlab_files',
+    'method_matrix',
+    'metric_tests',
     'mse',
+    'noise_gain',
+    'pair_saccades',
+    'pairwise_wilcoxon',
+    'parameters_fingerprint',
     'read_matlab',
+    'read_results',
+    'record_query',
+    'register_method',
+    'saccade_table',
+    'search_differentiators',
+    'smooth_noise_robust',
+    'super_lanczos',
+    'synthetic_records',
+    'synthetic_signals',
+    'warm_kernels',
+    'write_matlab',
+    'write_store',
 ]
@@ -1,16 +1,23 @@
-from dataclasses import dataclass
-from typing import Iterable
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional, Union
 
-from numpy import argmax, array
+from numpy import arange, array, asarray, concatenate, full, int8, int16, int32, repeat, tile, vstack, zeros
 from scipy.signal import decimate
 
-from .differentiation import METHODS, differentiate
+from .differentiation import CENTRAL_DIFFERENCES, METHODS, differentiate, differentiate_batch
 from .enums import Metric, Status
+from .fused import differentiate_reduce
 from .math import mse
+from .lru import CacheScope, SignalCache, shared_scope
+from .profiling import PROFILER
+from .saccades import MIN_DURATIONS, detect_saccades, detect_saccades_batch, pair_saccades, saccade_table
 
 
 @dataclass
 class DFLine:
+    __slots__ = ('status', 'noise', 'angle', 'method', 'metric', 'value', 'filename')
+
     status: Status
     noise: float
     angle: int
@@ -42,6 +49,85 @@ class DFLine:
         ]
 
 
+@dataclass
+class DFBlock:
+    # Array-backed form of the DFLines of one record and metric
+    filename: str
+    status: Status
+    noise: float
+    angle: int
+    factor: int
+    metric: Metric
+    methods: array
+    values: array
+    record: int = 0
+    # Reference saccade of every row for per-saccade metrics, so methods pair on the same saccade
+    saccades: Optional[array] = None
+
+    @classmethod
+    def from_lines(cls, record: 'Record', metric: Metric, lines: Iterable[DFLine]) -> 'DFBlock':
+        methods, values = [], []
+        for line in lines:
+            if line.metric == metric:
+                methods.append(line.method)
+                values.append(line.value)
+
+        return cls.from_values(record, metric, methods, values)
+
+    @classmethod
+    def from_values(
+        cls,
+        record: 'Record',
+        metric: Metric,
+        methods: Iterable[str],
+        values: Iterable,
+        saccades: Optional[Iterable[int]] = None
+    ) -> 'DFBlock':
+        return cls(
+            filename=str(record.filename),
+            status=record.status,
+            noise=record.noise,
+            angle=record.angle,
+            factor=record.factor,
+            metric=metric,
+            methods=array(methods, dtype=str),
+            values=asarray(values, dtype=metric.dtype),
+            record=record.index,
+            saccades=None if saccades is None else asarray(saccades, dtype=int32)
+        )
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @staticmethod
+    def column_names(metric: Metric) -> list[str]:
+        keys = ['Saccade'] if metric.per_saccade else []
+        return ['Filename', 'Status', 'Noise', 'Angle', 'Factor', 'Record', *keys, 'Method', metric.name]
+
+    @property
+    def df_rows(self) -> list[list]:
+        return [
+            [self.filename, self.status.value, self.noise, self.angle, method, value]
+            for method, value in zip(self.methods.tolist(), self.values.tolist())
+        ]
+
+    def columns(self) -> dict[str, array]:
+        count = len(self)
+        columns = {
+            'Filename': full(count, self.filename),
+            'Status': full(count, self.status.value, dtype=int8),
+            'Noise': full(count, self.noise),
+            'Angle': full(count, self.angle, dtype=int16),
+            'Factor': full(count, self.factor, dtype=int16),
+            'Record': full(count, self.record, dtype=int32),
+        }
+        if self.saccades is not None:
+            columns['Saccade'] = self.saccades
+        columns['Method'] = self.methods
+        columns[self.metric.name] = self.values
+        return columns
+
+
 @dataclass
 class Record:
     filename: str
@@ -55,80 +141,261 @@ class Record:
     Y: array
     V0: array
     Y0: array
+    factor: int = 1
+    # Position of the record within its file or store, keys the rows of its metric blocks
+    index: int = 0
+    # A scope of the process-wide SIGNAL_CACHE unless the record is given a cache of its own
+    cache: Union[CacheScope, SignalCache] = field(default_factory=shared_scope, repr=False, compare=False)
 
     def __str__(self):
         return f'Record for file: {self.filename}'
 
+    @property
+    def nbytes(self) -> int:
+        return self.X.nbytes + self.Y.nbytes + self.V0.nbytes + self.Y0.nbytes
+
     def downsampled(self, factor: int) -> 'Record':
+        if factor == 1:
+            return self
+
+        return self.cache.get(
+            ('downsampled', factor),
+            lambda: self._decimated(factor)
+        )
+
+    def _decimated(self, factor: int) -> 'Record':
+        # Y, V0 and Y0 share one anti-alias pass; X is a uniform time axis and is rebuilt
+        with PROFILER.stage('decimate'):
+            Y, V0, Y0 = decimate(vstack([self.Y, self.V0, self.Y0]), factor, axis=-1)
+        h = self.h * factor
+
         return Record(
             filename=self.filename,
             angle=self.angle,
             noise=self.noise,
-            h=self.h * factor,
+            h=h,
             status=self.status,
             saccades_count=self.saccades_count,
             threshold=self.threshold,
-            X=decimate(self.X, factor),
-            Y=decimate(self.Y, factor),
-            V0=decimate(self.V0, factor),
-            Y0=decimate(self.Y0, factor)
+            X=self.X[0] + h * arange(len(Y)),
+            Y=Y,
+            V0=V0,
+            Y0=Y0,
+            factor=self.factor * factor,
+            index=self.index,
+            cache=self.cache.scope()
         )
 
+    def downsampled_cascade(self, factors: Iterable[int]) -> dict[int, 'Record']:
+        # Each factor is reached from the largest already decimated factor that divides it
+        factors = list(factors)
+        cascade = {1: self}
+        for factor in sorted(set(factors)):
+            base = max(done for done in cascade if factor % done == 0)
+            cascade[factor] = cascade[base].downsampled(factor // base)
+
+        return {
+            factor: cascade[factor]
+            for factor in factors
+        }
+
     @property
     def sampling_frequency(self) -> float:
         return 1.0 / self.h
 
     def velocities(self, method: str) -> array:
-        return differentiate(self.Y, self.h, method)
+        row = self._stacked_velocities(method)
+        if row is not None:
+            return row
 
-    def saccades(self, velocities: array, min_duration: float = None) -> Iterable[tuple[int, int]]:
-        velocities = abs(velocities)
-        last = len(velocities) - 1
-        index = 0
+        return self.cache.get(
+            ('velocities', method),
+            lambda: self._differentiate(method)
+        )
 
-        if min_duration is None:
-            min_duration = {
-                20: 0.09,
-                30: 0.115,
-                60: 0.175,
-            }[self.angle]
-
-        while index < last:
-            if velocities[index] > self.threshold:
-                onset = index
-                while onset > 0 and velocities[onset - 1] >= 20:
-                    onset -= 1
-                offset = index
-                while offset < last and velocities[offset + 1] >= 20:
-                    offset += 1
-
-                if (offset - onset) * self.h >= min_duration:
-                    yield onset, offset
-
-                index = offset + 1
+    def _differentiate(self, method: str) -> array:
+        with PROFILER.stage(f'differentiate/{method}'):
+            return differentiate(self.Y, self.h, method)
+
+    def _stacked_velocities(self, method: str) -> Optional[array]:
+        if ('velocity_stack',) in self.cache:
+            stacked, stack = self.cache.get(('velocity_stack',), None)
+            if method in stacked:
+                return stack[stacked.index(method)]
+        return None
+
+    def _seed_velocities(self, methods: list[str], rows: array):
+        # A single (methods, samples) copy per record is the cached form of precomputed velocities,
+        # rows seeded before for other methods are kept
+        if ('velocity_stack',) in self.cache:
+            stacked, stack = self.cache.get(('velocity_stack',), None)
+            kept = [index for index, method in enumerate(stacked) if method not in methods]
+            methods = [stacked[index] for index in kept] + list(methods)
+            rows = vstack([stack[kept], rows])
+        else:
+            rows = rows.copy()
+        self.cache.put(('velocity_stack',), (tuple(methods), rows))
+
+    def velocity_stack(self, methods: list[str]) -> tuple[array, array]:
+        # The (methods, samples) stack seeded by precompute and the row of every requested method,
+        # or a new uncached stack when the seeded one lacks some of them
+        if ('velocity_stack',) in self.cache:
+            stacked, stack = self.cache.get(('velocity_stack',), None)
+            if set(methods) <= set(stacked):
+                return stack, array([stacked.index(method) for method in methods], dtype=int)
+
+        return vstack([self.velocities(method) for method in methods]), arange(len(methods))
+
+    def abs_velocities(self, method: str) -> array:
+        return self.cache.get(
+            ('abs_velocities', method),
+            lambda: abs(self.velocities(method))
+        )
+
+    def all_velocities(self, methods: Iterable[str] = METHODS) -> dict[str, array]:
+        Record.precompute([self], [
+            method
+            for method in methods
+            if self._stacked_velocities(method) is None and ('velocities', method) not in self.cache
+        ])
+        return {
+            method: self.velocities(method)
+            for method in methods
+        }
+
+    @staticmethod
+    def precompute(records: list['Record'], methods: list[str], segmented: Iterable[str] = (), engine: str = 'stencil'):
+        # Differentiates (and segments) equal-length records together and seeds their caches
+        segmented = list(segmented)
+        if not methods:
+            return
+
+        groups = defaultdict(list)
+        for record in records:
+            groups[len(record.Y), record.h].append(record)
+
+        for (samples, h), group in groups.items():
+            signals = vstack([record.Y for record in group])
+            if PROFILER.enabled:
+                # One kernel call per method, so that each gets its own timer
+                stack = zeros((len(methods), len(group), samples))
+                for index, method in enumerate(methods):
+                    with PROFILER.stage(f'differentiate/{method}'):
+                        stack[index] = differentiate_batch(signals, h, [method], engine)[0]
             else:
-                index += 1
+                stack = differentiate_batch(signals, h, methods, engine)
+            for position, record in enumerate(group):
+                # Copied out, a view would pin the whole group stack while counting one record
+                record._seed_velocities(methods, stack[:, position])
+
+            if not segmented:
+                continue
+
+            rows = stack[[methods.index(method) for method in segmented]].reshape(-1, samples)
+            with PROFILER.stage('detect'):
+                saccades, bounds = detect_saccades_batch(
+                    rows,
+                    tile([record.threshold for record in group], len(segmented)),
+                    h,
+                    tile([record.min_duration for record in group], len(segmented))
+                )
+                for position, record in enumerate(group):
+                    for index, method in enumerate(segmented):
+                        row = index * len(group) + position
+                        record.cache.put(('detected_events', method), saccade_table(
+                            saccades[bounds[row]:bounds[row + 1]],
+                            stack[methods.index(method), position],
+                            record.Y
+                        ))
+            PROFILER.count('saccades', len(saccades))
+
+    @staticmethod
+    def reduce_metrics(records: list['Record'], methods: list[str], segmented: Iterable[str] = ()):
+        # Seeds the MSE and detected saccade counts of equal-length records straight from Y and V0,
+        # for methods whose velocities nothing else needs
+        segmented = set(segmented)
+        if not methods:
+            return
+
+        groups = defaultdict(list)
+        for record in records:
+            groups[len(record.Y), record.h].append(record)
+
+        for (_, h), group in groups.items():
+            with PROFILER.stage('differentiate+reduce'):
+                errors, _, saccades = differentiate_reduce(
+                    vstack([record.Y for record in group]),
+                    vstack([record.V0 for record in group]),
+                    h,
+                    methods,
+                    asarray([record.threshold for record in group], dtype=float),
+                    asarray([record.min_duration for record in group], dtype=float)
+                )
+            for position, record in enumerate(group):
+                for index, method in enumerate(methods):
+                    record.cache.put(('mse', method), float(errors[index, position]))
+                    if method in segmented:
+                        record.cache.put(('saccade_count', method), int(saccades[index, position]))
+
+    @property
+    def min_duration(self) -> float:
+        return MIN_DURATIONS[self.angle]
+
+    def saccades(self, velocities: array, min_duration: float = None) -> array:
+        if min_duration is None:
+            min_duration = self.min_duration
+
+        with PROFILER.stage('detect'):
+            return detect_saccades(velocities, self.threshold, self.h, min_duration)
+
+    def saccade_events(self, velocities: array, positions: Optional[array] = None) -> array:
+        return saccade_table(
+            self.saccades(velocities),
+            velocities,
+            self.Y if positions is None else positions
+        )
+
+    def reference_events(self) -> array:
+        return self.cache.get(
+            ('reference_events',),
+            lambda: self.saccade_events(self.V0, self.Y0)
+        )
+
+    def detected_events(self, method: str) -> array:
+        return self.cache.get(
+            ('detected_events', method),
+            lambda: self.saccade_events(self.velocities(method))
+        )
+
+    def mse(self, method: str) -> float:
+        return self.cache.get(
+            ('mse', method),
+            lambda: mse(self.V0, self.velocities(method))
+        )
+
+    def saccade_count(self, method: str) -> int:
+        return self.cache.get(
+            ('saccade_count', method),
+            lambda: len(self.detected_events(method))
+        )
 
     def mse_lines(self) -> Iterable[DFLine]:
         for method in METHODS:
-            approx = self.velocities(method)
-
             yield DFLine(
                 status=self.status,
                 noise=self.noise,
                 angle=self.angle,
                 metric=Metric.MSE,
-                value=mse(self.V0, approx),
+                value=self.mse(method),
                 filename=self.filename,
                 method=method
             )
 
     def detected_saccades_lines(self) -> Iterable[DFLine]:
         for method in METHODS:
-            if method in {'cd3', 'cd5', 'cd7', 'cd9'}:
+            if method in CENTRAL_DIFFERENCES:
                 continue
-            approx = self.velocities(method)
-            saccades = len(list(self.saccades(approx)))
+            saccades = self.saccade_count(method)
 
             yield DFLine(
                 status=self.status,
@@ -141,68 +408,131 @@ class Record:
             )
 
     def peak_velocity_lines(self) -> Iterable[DFLine]:
+        reference = self.reference_events()
+
         for method in METHODS:
-            if method in {'cd3', 'cd5', 'cd7', 'cd9'}:
+            if method in CENTRAL_DIFFERENCES:
                 continue
 
-            V0 = abs(self.V0)
-            approx = abs(self.velocities(method))
-
-            for onset, offset in self.saccades(V0):
-                V0_part = V0[onset:offset]
-                max_idx = argmax(V0_part)
+            approx = self.abs_velocities(method)
 
+            for peak, peak_velocity in zip(reference['peak'], reference['peak_velocity']):
                 yield DFLine(
                     status=self.status,
                     noise=self.noise,
                     angle=self.angle,
                     metric=Metric.PeakVelocity,
-                    value=approx[onset:offset][max_idx] - V0_part[max_idx],
+                    value=approx[peak] - peak_velocity,
                     filename=self.filename,
                     method=method
                 )
 
+    def peak_velocity_block(self) -> DFBlock:
+        # peak_velocity_lines as one gather of every method at every reference peak
+        reference = self.reference_events()
+        methods = [
+            method
+            for method in METHODS
+            if method not in CENTRAL_DIFFERENCES
+        ]
+        stack, rows = self.velocity_stack(methods)
+        values = abs(stack[rows[:, None], reference['peak'][None, :]]) - reference['peak_velocity'][None, :]
+
+        return DFBlock.from_values(
+            self,
+            Metric.PeakVelocity,
+            repeat(methods, len(reference)),
+            values.ravel(),
+            tile(arange(len(reference)), len(methods))
+        )
+
+    def paired_times(self, method: str) -> tuple[array, array, array]:
+        # Reference saccade index, duration error and latency of every saccade the method paired
+        reference = self.reference_events()
+        events = self.detected_events(method)
+        with PROFILER.stage('pair'):
+            reference_indices, detected_indices = pair_saccades(reference, events)
+        paired_reference = reference[reference_indices]
+        paired_detected = events[detected_indices]
+
+        r_durations = (paired_reference['offset'] - paired_reference['onset']) * self.h
+        a_durations = (paired_detected['offset'] - paired_detected['onset']) * self.h
+        latencies = (paired_detected['onset'] - paired_reference['onset']) * self.h
+        return reference_indices, a_durations - r_durations, latencies
+
     def time_lines(self) -> Iterable[DFLine]:
-        saccades = list(self.saccades(self.V0))
+        for method in METHODS:
+            if method in CENTRAL_DIFFERENCES:
+                continue
+
+            _, durations, latencies = self.paired_times(method)
+            for duration, latency in zip(durations, latencies):
+                yield DFLine(
+                    status=self.status,
+                    noise=self.noise,
+                    angle=self.angle,
+                    metric=Metric.Duration,
+                    value=duration,
+                    filename=self.filename,
+                    method=method
+                )
+
+                yield DFLine(
+                    status=self.status,
+                    noise=self.noise,
+                    angle=self.angle,
+                    metric=Metric.Latency,
+                    value=latency,
+                    filename=self.filename,
+                    method=method
+                )
 
+    def time_blocks(self) -> dict[Metric, DFBlock]:
+        # time_lines as Duration and Latency blocks whose rows carry the paired reference saccade
+        methods, saccades, durations, latencies = [], [], [], []
         for method in METHODS:
-            if method in {'cd3', 'cd5', 'cd7', 'cd9'}:
+            if method in CENTRAL_DIFFERENCES:
                 continue
 
-            pairing = {
-                sacc: []
-                for sacc in saccades
-            }
-            approx = abs(self.velocities(method))
-
-            for onset, offset in self.saccades(approx):
-                for (r_onset, r_offset), paired in pairing.items():
-                    if (r_onset <= onset <= r_offset) or (r_onset <= offset <= r_offset) or (onset <= r_onset and offset >= r_offset):
-                        paired.append((onset, offset))
-                        break
-
-            for (r_onset, r_offset), candidates in pairing.items():
-                if len(candidates) == 1:
-                    a_onset, a_offset = candidates[0]
-                    r_duration = (r_offset - r_onset) * self.h
-                    a_duration = (a_offset - a_onset) * self.h
-
-                    yield DFLine(
-                        status=self.status,
-                        noise=self.noise,
-                        angle=self.angle,
-                        metric=Metric.Duration,
-                        value=a_duration - r_duration,
-                        filename=self.filename,
-                        method=method
-                    )
-
-                    yield DFLine(
-                        status=self.status,
-                        noise=self.noise,
-                        angle=self.angle,
-                        metric=Metric.Latency,
-                        value=(a_onset - r_onset) * self.h,
-                        filename=self.filename,
-                        method=method
-                    )
+            reference_indices, method_durations, method_latencies = self.paired_times(method)
+            methods.append(full(len(reference_indices), method))
+            saccades.append(reference_indices)
+            durations.append(method_durations)
+            latencies.append(method_latencies)
+
+        methods, saccades = concatenate(methods), concatenate(saccades)
+        return {
+            Metric.Duration: DFBlock.from_values(self, Metric.Duration, methods, concatenate(durations), saccades),
+            Metric.Latency: DFBlock.from_values(self, Metric.Latency, methods, concatenate(latencies), saccades),
+        }
+
+
+def _lazy_signal(name: str) -> property:
+    def getter(self: 'LazyRecord') -> array:
+        value = self.__dict__.get(name)
+        if value is None:
+            value = self.__dict__[name] = self.source.signal(name, self.index)
+        return value
+
+    def setter(self: 'LazyRecord', value: Optional[array]):
+        self.__dict__[name] = value
+
+    return property(getter, setter)
+
+
+class LazyRecord(Record):
+    # Record whose signals not passed on construction are decoded by source.signal on first access
+    X = _lazy_signal('X')
+    Y = _lazy_signal('Y')
+    V0 = _lazy_signal('V0')
+    Y0 = _lazy_signal('Y0')
+
+    def __init__(self, source: Any, index: int, **fields):
+        self.source = source
+        for signal in ('X', 'Y', 'V0', 'Y0'):
+            fields.setdefault(signal, None)
+        super().__init__(index=index, **fields)
+
+    def __reduce__(self):
+        # Workers receive a plain Record with every signal decoded
+        return Record, tuple(getattr(self, field) for field in Record.__dataclass_fields__)
@@ -0,0 +1,146 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from itertools import product
+from typing import Iterable, Optional
+
+from numpy import arange, array, asarray, atleast_2d, einsum, eye, float64, vstack, zeros
+from numpy.lib.stride_tricks import sliding_window_view
+from numpy.linalg import solve
+from pandas import DataFrame
+
+from .dataclasses import Record
+from .differentiation import Differentiator
+
+
+@dataclass
+class DesignProblem:
+    # Normal equations of the least squares fit of the coefficients c_k of an antisymmetric FIR
+    # differentiator to V0. The design matrix holds the lagged differences (Y[i + k] - Y[i - k]) / h,
+    # k = 1..radius, of every sample at least radius away from both ends of its record.
+    gram: array
+    moment: array
+    energy: float
+    samples: int
+
+    @property
+    def radius(self) -> int:
+        return len(self.moment)
+
+    @classmethod
+    def empty(cls, radius: int) -> 'DesignProblem':
+        return cls(zeros((radius, radius)), zeros(radius), 0.0, 0)
+
+    @classmethod
+    def from_signals(cls, Y: array, V0: array, h: float, radius: int) -> 'DesignProblem':
+        # Y and V0 are one record or (records, samples) records sharing h
+        Y = atleast_2d(asarray(Y, dtype=float64))
+        V0 = atleast_2d(asarray(V0, dtype=float64))
+        if Y.shape[1] <= 2 * radius:
+            return cls.empty(radius)
+
+        windows = sliding_window_view(Y, 2 * radius + 1, axis=-1)
+        design = ((windows[..., radius + 1:] - windows[..., radius - 1::-1]) / h).reshape(-1, radius)
+        target = V0[:, radius:-radius].ravel()
+        return cls(design.T @ design, design.T @ target, float(target @ target), len(target))
+
+    @classmethod
+    def from_records(cls, records: Iterable[Record], radius: int) -> 'DesignProblem':
+        groups = defaultdict(list)
+        for record in records:
+            groups[len(record.Y), record.h].append(record)
+
+        problem = cls.empty(radius)
+        for (_, h), group in groups.items():
+            problem += cls.from_signals(
+                vstack([record.Y for record in group]),
+                vstack([record.V0 for record in group]),
+                h,
+                radius
+            )
+        return problem
+
+    def __add__(self, other: 'DesignProblem') -> 'DesignProblem':
+        return DesignProblem(
+            self.gram + other.gram,
+            self.moment + other.moment,
+            self.energy + other.energy,
+            self.samples + other.samples
+        )
+
+    def _padded(self, coefficients: array) -> array:
+        coefficients = atleast_2d(asarray(coefficients, dtype=float64))
+        if coefficients.shape[1] > self.radius:
+            raise ValueError(f'Coefficients of radius {coefficients.shape[1]} exceed the problem radius {self.radius}')
+        padded = zeros((len(coefficients), self.radius))
+        padded[:, :coefficients.shape[1]] = coefficients
+        return padded
+
+    def mse(self, coefficients: array) -> array:
+        # Mean squared error against V0 of every (candidates, radius) row, as one batch of quadratic forms
+        coefficients = self._padded(coefficients)
+        quadratic = einsum('ij,jk,ik->i', coefficients, self.gram, coefficients)
+        return (quadratic - 2 * coefficients @ self.moment + self.energy) / self.samples
+
+    def fit(self, radii: Iterable[int], penalties: Iterable[float] = (0.0,), exact_linear: bool = True) -> array:
+        # Minimises mse + penalty * noise gain for every (radius, penalty) pair with one batched solve.
+        # The penalty is in squared velocity units: the white noise variance sigma^2 / h^2 to be robust
+        # against. With exact_linear the fit is constrained to sum(2 k c_k) = 1, like every textbook
+        # method, and the Lagrange multiplier takes the last unknown. Rows are padded to the problem radius.
+        candidates = list(product(radii, penalties))
+        size = self.radius + 1
+        systems = zeros((len(candidates), size, size))
+        rhs = zeros((len(candidates), size))
+        weights = 2.0 * arange(1, self.radius + 1)
+
+        for index, (radius, penalty) in enumerate(candidates):
+            if not 1 <= radius <= self.radius:
+                raise ValueError(f'Expected a radius between 1 and {self.radius}, got {radius}')
+
+            systems[index, :radius, :radius] = self.gram[:radius, :radius] / self.samples + 2 * penalty * eye(radius)
+            systems[index, radius:self.radius, radius:self.radius] = eye(self.radius - radius)
+            rhs[index, :radius] = self.moment[:radius] / self.samples
+            if exact_linear:
+                systems[index, :radius, -1] = weights[:radius]
+                systems[index, -1, :radius] = weights[:radius]
+                rhs[index, -1] = 1.0
+            else:
+                systems[index, -1, -1] = 1.0
+
+        return solve(systems, rhs[..., None])[:, :-1, 0]
+
+
+def noise_gain(coefficients: array) -> array:
+    # Differentiator.noise_gain of every row of a (candidates, radius) coefficient matrix
+    return 2 * (atleast_2d(asarray(coefficients, dtype=float64)) ** 2).sum(axis=1)
+
+
+def fitted_differentiator(coefficients: Iterable[float]) -> Differentiator:
+    coefficients = [float(coefficient) for coefficient in coefficients]
+    while len(coefficients) > 1 and coefficients[-1] == 0:
+        coefficients.pop()
+    return Differentiator(tuple(coefficients), 1)
+
+
+def search_differentiators(
+    training: DesignProblem,
+    validation: Optional[DesignProblem] = None,
+    radii: Iterable[int] = range(2, 9),
+    penalties: Iterable[float] = (0.0,),
+    exact_linear: bool = True
+) -> DataFrame:
+    # Fits every (radius, penalty) candidate on the training problem and scores it on both problems,
+    # best validation error first. Both problems must be built with the same radius.
+    validation = training if validation is None else validation
+    radii, penalties = list(radii), list(penalties)
+    coefficients = training.fit(radii, penalties, exact_linear)
+    candidates = list(product(radii, penalties))
+
+    return DataFrame({
+        'Radius': [radius for radius, _ in candidates],
+        'Points': [2 * radius + 1 for radius, _ in candidates],
+        'Penalty': [penalty for _, penalty in candidates],
+        'NoiseGain': noise_gain(coefficients),
+        'TrainingMSE': training.mse(coefficients),
+        'ValidationMSE': validation.mse(coefficients),
+        'Coefficients': [tuple(row[:radius].tolist()) for row, (radius, _) in zip(coefficients, candidates)],
+    }).sort_values('ValidationMSE', ignore_index=True)
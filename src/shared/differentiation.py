@@ -1,137 +1,297 @@
-from numba import njit, stencil
-from numpy import array
+from dataclasses import dataclass
+from fractions import Fraction
+from math import comb, lcm
+from typing import Iterable, Iterator, Optional, Union
 
+from numba import njit, prange
+from numpy import arange, array, asarray, ascontiguousarray, atleast_2d, complex128, concatenate, empty, float64, int64, pi, sin, zeros
+from scipy.fft import irfft, next_fast_len, rfft, rfftfreq
 
-@njit(fastmath=True, parallel=True)
-def central_difference_3(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (f[1] - f[-1]) / (2 * h)
-    )(data, step)
 
+CHUNK_SIZE = 4096
+ENGINES = ('stencil', 'fft')
+# Samples read per block by the out-of-core drivers
+STREAM_BLOCK_SIZE = 1 << 20
 
-@njit(fastmath=True, parallel=True)
-def central_difference_5(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (f[-2] - 8 * f[-1] + 8 * f[1] - f[2]) / (12 * h)
-    )(data, step)
 
+@dataclass(frozen=True)
+class Differentiator:
+    # f'[i] = sum(c_k * (f[i + k] - f[i - k]) for k = 1..radius) / (denominator * h)
+    coefficients: tuple[Union[int, float], ...]
+    denominator: int
 
-@njit(fastmath=True, parallel=True)
-def central_difference_7(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (-f[-3] + 9 * f[-2] - 45 * f[-1] + 45 * f[1] - 9 * f[2] + f[3]) / (60 * h)
-    )(data, step)
+    @property
+    def radius(self) -> int:
+        return len(self.coefficients)
 
+    @property
+    def points(self) -> int:
+        return 2 * self.radius + 1
 
-@njit(fastmath=True, parallel=True)
-def central_difference_9(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (3 * f[-4] - 32 * f[-3] + 168 * f[-2] - 672 * f[-1] + 672 * f[1] - 168 * f[2] + 32 * f[3] - 3 * f[4]) / (840 * h)
-    )(data, step)
+    @property
+    def noise_gain(self) -> float:
+        # Variance of the output for unit variance white noise input and h = 1
+        return 2 * sum(coefficient ** 2 for coefficient in self.coefficients) / self.denominator ** 2
 
+    @classmethod
+    def from_fractions(cls, coefficients: Iterable[Fraction]) -> 'Differentiator':
+        coefficients = list(coefficients)
+        denominator = lcm(*(coefficient.denominator for coefficient in coefficients))
+        return cls(
+            coefficients=tuple(int(coefficient * denominator) for coefficient in coefficients),
+            denominator=denominator
+        )
 
-@njit(fastmath=True, parallel=True)
-def lanczos_5(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (f[1] - f[-1] + 2 * (f[2] - f[-2])) / (10 * h)
-    )(data, step)
 
+def _radius(points: int, minimum: int) -> int:
+    if points < minimum or points % 2 == 0:
+        raise ValueError(f'Expected an odd number of points greater or equal than {minimum}, got {points}')
+    return (points - 1) // 2
 
-@njit(fastmath=True, parallel=True)
-def lanczos_7(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (f[1] - f[-1] + 2 * (f[2] - f[-2]) + 3 * (f[3] - f[-3])) / (28 * h)
-    )(data, step)
 
+def _solve(matrix: list[list[Fraction]], rhs: list[Fraction]) -> list[Fraction]:
+    size = len(rhs)
+    augmented = [row[:] + [value] for row, value in zip(matrix, rhs)]
 
-@njit(fastmath=True, parallel=True)
-def lanczos_9(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (f[1] - f[-1] + 2 * (f[2] - f[-2]) + 3 * (f[3] - f[-3]) + 4 * (f[4] - f[-4])) / (60 * h)
-    )(data, step)
+    for column in range(size):
+        pivot = next(row for row in range(column, size) if augmented[row][column] != 0)
+        augmented[column], augmented[pivot] = augmented[pivot], augmented[column]
+        for row in range(size):
+            if row != column and augmented[row][column] != 0:
+                factor = augmented[row][column] / augmented[column][column]
+                augmented[row] = [a - factor * b for a, b in zip(augmented[row], augmented[column])]
 
+    return [augmented[row][size] / augmented[row][row] for row in range(size)]
 
-@njit(fastmath=True, parallel=True)
-def lanczos_11(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (f[1] - f[-1] + 2 * (f[2] - f[-2]) + 3 * (f[3] - f[-3]) + 4 * (f[4] - f[-4]) + 5 * (f[5] - f[-5])) / (110 * h)
-    )(data, step)
 
+def polynomial_derivative(points: int, degree: int) -> Differentiator:
+    # Derivative at the centre of the least squares polynomial of the given degree
+    radius = _radius(points, 3)
+    powers = list(range(1, degree + 1, 2))
+    if len(powers) > radius:
+        raise ValueError(f'A polynomial of degree {degree} needs more than {points} points')
 
-@njit(fastmath=True, parallel=True)
-def lanczos_13(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (f[1] - f[-1] + 2 * (f[2] - f[-2]) + 3 * (f[3] - f[-3]) + 4 * (f[4] - f[-4]) + 5 * (f[5] - f[-5])) + 6 * (f[6] - f[-6]) / (182 * h)
-    )(data, step)
+    def moment(power: int) -> Fraction:
+        return Fraction(2 * sum(k ** power for k in range(1, radius + 1)))
 
+    inverse_row = _solve(
+        [[moment(p + q) for q in powers] for p in powers],
+        [Fraction(int(index == 0)) for index in range(len(powers))]
+    )
 
-@njit(fastmath=True, parallel=True)
-def super_lanczos_7(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (58 * (f[1] - f[-1]) + 67 * (f[2] - f[-2]) - 22 * (f[3] - f[-3])) / (252 * h)
-    )(data, step)
+    return Differentiator.from_fractions(
+        sum(weight * k ** power for weight, power in zip(inverse_row, powers))
+        for k in range(1, radius + 1)
+    )
 
 
-@njit(fastmath=True, parallel=True)
-def super_lanczos_9(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (126 * (f[1] - f[-1]) + 193 * (f[2] - f[-2]) + 142 * (f[3] - f[-3]) - 86 * (f[4] - f[-4])) / (1188 * h)
-    )(data, step)
+def central_difference(points: int) -> Differentiator:
+    return polynomial_derivative(points, points - 1)
 
 
-@njit(fastmath=True, parallel=True)
-def super_lanczos_11(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (296 * (f[1] - f[-1]) + 503 * (f[2] - f[-2]) + 532 * (f[3] - f[-3]) + 294 * (f[4] - f[-4]) - 300 * (f[5] - f[-5])) / (5148 * h)
-    )(data, step)
+def lanczos(points: int) -> Differentiator:
+    return polynomial_derivative(points, 2)
 
 
-@njit(fastmath=True, parallel=True)
-def smooth_noise_robust_5(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (2 * (f[1] - f[-1]) + f[2] - f[-2]) / (8 * h)
-    )(data, step)
+def super_lanczos(points: int) -> Differentiator:
+    _radius(points, 5)
+    return polynomial_derivative(points, 4)
 
 
-@njit(fastmath=True, parallel=True)
-def smooth_noise_robust_7(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (5 * (f[1] - f[-1]) + 4 * (f[2] - f[-2]) + f[3] - f[-3]) / (32 * h)
-    )(data, step)
+def smooth_noise_robust(points: int) -> Differentiator:
+    # Holoborodko's smooth noise-robust differentiators, exact on 1, x, x^2
+    radius = _radius(points, 5)
+    m = radius - 1
 
+    def binomial(k: int) -> int:
+        return comb(2 * m, k) if 0 <= k <= 2 * m else 0
 
-@njit(fastmath=True, parallel=True)
-def smooth_noise_robust_9(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (14 * (f[1] - f[-1]) + 14 * (f[2] - f[-2]) + 6 * (f[3] - f[-3]) + f[4] - f[-4]) / (128 * h)
-    )(data, step)
-
-
-@njit(fastmath=True, parallel=True)
-def smooth_noise_robust_11(data: array, step: float) -> array:
-    return stencil(
-        lambda f, h: (42 * (f[1] - f[-1]) + 48 * (f[2] - f[-2]) + 27 * (f[3] - f[-3]) + 8 * (f[4] - f[-4]) + f[5] - f[-5]) / (512 * h)
-    )(data, step)
+    return Differentiator.from_fractions(
+        Fraction(binomial(m - k + 1) - binomial(m - k - 1), 2 ** (2 * m + 1))
+        for k in range(1, radius + 1)
+    )
 
 
 METHODS = {
-    'cd3': central_difference_3,
-    'cd5': central_difference_5,
-    'cd7': central_difference_7,
-    'cd9': central_difference_9,
-    'l5': lanczos_5,
-    'l7': lanczos_7,
-    'l9': lanczos_9,
-    'l11': lanczos_11,
-    'l13': lanczos_13,
-    'sl7': super_lanczos_7,
-    'sl9': super_lanczos_9,
-    'sl11': super_lanczos_11,
-    'snr5': smooth_noise_robust_5,
-    'snr7': smooth_noise_robust_7,
-    'snr9': smooth_noise_robust_9,
-    'snr11': smooth_noise_robust_11,
+    'cd3': Differentiator((1,), 2),
+    'cd5': Differentiator((8, -1), 12),
+    'cd7': Differentiator((45, -9, 1), 60),
+    'cd9': Differentiator((672, -168, 32, -3), 840),
+    'l5': Differentiator((1, 2), 10),
+    'l7': Differentiator((1, 2, 3), 28),
+    'l9': Differentiator((1, 2, 3, 4), 60),
+    'l11': Differentiator((1, 2, 3, 4, 5), 110),
+    'l13': Differentiator((1, 2, 3, 4, 5, 6), 182),
+    'sl7': Differentiator((58, 67, -22), 252),
+    'sl9': Differentiator((126, 193, 142, -86), 1188),
+    'sl11': Differentiator((296, 503, 532, 294, -300), 5148),
+    'snr5': Differentiator((2, 1), 8),
+    'snr7': Differentiator((5, 4, 1), 32),
+    'snr9': Differentiator((14, 14, 6, 1), 128),
+    'snr11': Differentiator((42, 48, 27, 8, 1), 512),
 }
-
-def differentiate(data: array, step: float, method: str='l11') -> array:
-    return METHODS[method](data, step)
+_BUILTIN_METHODS = frozenset(METHODS)
+# Too noisy to segment saccades, these methods only take part in the MSE comparison
+CENTRAL_DIFFERENCES = frozenset({'cd3', 'cd5', 'cd7', 'cd9'})
+
+
+def register_method(name: str, differentiator: Differentiator):
+    # Registered methods join every METHODS loop, the shard fingerprint and the extraction workers
+    if name in _BUILTIN_METHODS:
+        raise ValueError(f'Cannot replace the built-in method "{name}"')
+    METHODS[name] = differentiator
+
+
+@njit(parallel=True)
+def _antisymmetric_fir(data: array, coefficients: array, radii: array, denominators: array, step: float) -> array:
+    methods = coefficients.shape[0]
+    records, samples = data.shape
+    chunks = (samples + CHUNK_SIZE - 1) // CHUNK_SIZE
+    result = zeros((methods, records, samples))
+
+    for task in prange(methods * records * chunks):
+        method = task // (records * chunks)
+        record = task // chunks % records
+        chunk = task % chunks
+        radius = radii[method]
+        scale = denominators[method] * step
+
+        for index in range(max(radius, chunk * CHUNK_SIZE), min(samples - radius, (chunk + 1) * CHUNK_SIZE)):
+            value = 0.0
+            for k in range(1, radius + 1):
+                value += coefficients[method, k - 1] * (data[record, index + k] - data[record, index - k])
+            result[method, record, index] = value / scale
+
+    return result
+
+
+def _differentiator(method: Union[str, Differentiator]) -> Differentiator:
+    return method if isinstance(method, Differentiator) else METHODS[method]
+
+
+def _stencils(differentiators: list[Differentiator]) -> tuple[array, array, array]:
+    # Zero padded (methods, radius) coefficients, radii and denominators for the compiled kernels
+    radius = max((differentiator.radius for differentiator in differentiators), default=0)
+
+    coefficients = zeros((len(differentiators), radius), dtype=float64)
+    radii = zeros(len(differentiators), dtype=int64)
+    denominators = zeros(len(differentiators), dtype=float64)
+    for index, differentiator in enumerate(differentiators):
+        coefficients[index, :differentiator.radius] = differentiator.coefficients
+        radii[index] = differentiator.radius
+        denominators[index] = differentiator.denominator
+
+    return coefficients, radii, denominators
+
+
+def frequency_response(
+    frequencies: array,
+    step: float = 1.0,
+    methods: Iterable[Union[str, Differentiator]] = METHODS
+) -> array:
+    # (methods, frequencies) complex response at angular frequencies in radians per sample, the ideal
+    # differentiator being 1j * frequencies / step. Noise gains follow as mean(|H|^2) over [0, pi] at step 1.
+    differentiators = [_differentiator(method) for method in methods]
+    frequencies = asarray(frequencies, dtype=float64)
+    response = zeros((len(differentiators), len(frequencies)), dtype=complex128)
+    for index, differentiator in enumerate(differentiators):
+        lags = arange(1, differentiator.radius + 1)
+        sines = sin(lags[:, None] * frequencies[None, :])
+        response[index] = 2j * (array(differentiator.coefficients, dtype=float64) @ sines) / (differentiator.denominator * step)
+    return response
+
+
+def _fft_differentiate(data: array, step: float, differentiators: list[Differentiator]) -> array:
+    # One forward transform for all records, then one inverse per method over all records. The
+    # transform is circular, but interior samples never reach across the ends, so only the edges
+    # are cleared afterwards.
+    records, samples = data.shape
+    result = zeros((len(differentiators), records, samples))
+    if samples == 0:
+        return result
+
+    size = next_fast_len(samples, real=True)
+    spectrum = rfft(data, size, axis=-1, workers=-1)
+    responses = frequency_response(2 * pi * rfftfreq(size), step, differentiators)
+
+    for index, differentiator in enumerate(differentiators):
+        radius = differentiator.radius
+        if samples > 2 * radius:
+            result[index, :, radius:samples - radius] = irfft(
+                responses[index] * spectrum,
+                size,
+                axis=-1,
+                workers=-1
+            )[:, radius:samples - radius]
+    return result
+
+
+def differentiate(data: array, step: float, method: Union[str, Differentiator] = 'l11', engine: str = 'stencil') -> array:
+    return differentiate_batch(data, step, [method], engine)[0, 0]
+
+
+def differentiate_batch(
+    data: array,
+    step: float,
+    methods: Iterable[Union[str, Differentiator]] = METHODS,
+    engine: str = 'stencil'
+) -> array:
+    differentiators = [_differentiator(method) for method in methods]
+    if engine == 'fft':
+        return _fft_differentiate(ascontiguousarray(atleast_2d(data), dtype=float64), step, differentiators)
+    if engine != 'stencil':
+        raise ValueError(f'Unknown engine "{engine}", expected one of {ENGINES}')
+
+    data = ascontiguousarray(atleast_2d(data), dtype=float64)
+    return _antisymmetric_fir(data, *_stencils(differentiators), step)
+
+
+def differentiate_stream(
+    blocks: Iterable[array],
+    step: float,
+    methods: Iterable[Union[str, Differentiator]] = METHODS
+) -> Iterator[array]:
+    # Yields (methods, samples) velocity blocks for a signal given as consecutive sample blocks.
+    # Each block is differentiated together with a halo of the largest stencil radius carried
+    # over from the previous ones, so the stitched output equals differentiate_batch exactly.
+    differentiators = [_differentiator(method) for method in methods]
+    halo = max((differentiator.radius for differentiator in differentiators), default=0)
+    carry = empty(0)
+    offset = 0
+    emitted = 0
+
+    for block in blocks:
+        buffer = concatenate([carry, block])
+        ready = offset + len(buffer) - halo
+        if ready > emitted:
+            yield differentiate_batch(buffer, step, differentiators)[:, 0, emitted - offset:ready - offset]
+            emitted = ready
+
+        start = max(offset, emitted - halo)
+        carry = buffer[start - offset:]
+        offset = start
+
+    if offset + len(carry) > emitted:
+        yield differentiate_batch(carry, step, differentiators)[:, 0, emitted - offset:]
+
+
+def differentiate_chunked(
+    data: array,
+    step: float,
+    methods: Iterable[Union[str, Differentiator]] = METHODS,
+    block_size: int = STREAM_BLOCK_SIZE,
+    out: Optional[array] = None
+) -> array:
+    # Out-of-core differentiate_batch for one long signal, e.g. a memmap from the record store.
+    # Only block_size samples plus halos are loaded at once; out may itself be a writable memmap.
+    differentiators = [_differentiator(method) for method in methods]
+    if out is None:
+        out = empty((len(differentiators), len(data)))
+
+    position = 0
+    blocks = (data[start:start + block_size] for start in range(0, len(data), block_size))
+    for velocities in differentiate_stream(blocks, step, differentiators):
+        out[:, position:position + velocities.shape[1]] = velocities
+        position += velocities.shape[1]
+
+    return out
@@ -8,6 +8,14 @@ class Metric(IntEnum):
     Duration = 3
     Latency = 4
 
+    @property
+    def dtype(self) -> str:
+        return 'i4' if self == Metric.DetectedSaccades else 'f8'
+
+    @property
+    def per_saccade(self) -> bool:
+        return self in (Metric.PeakVelocity, Metric.Duration, Metric.Latency)
+
 
 class Status(IntEnum):
     Healthy = 0
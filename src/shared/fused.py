@@ -0,0 +1,104 @@
+from typing import Iterable, Union
+
+from numba import njit, prange
+from numpy import array, ascontiguousarray, atleast_2d, float64, full, inf, int64, zeros
+
+from .differentiation import METHODS, Differentiator, _differentiator, _stencils
+from .saccades import _detector_end, _detector_step
+
+
+@njit(parallel=True)
+def _differentiate_reduce(
+    data: array,
+    reference: array,
+    coefficients: array,
+    radii: array,
+    denominators: array,
+    step: float,
+    thresholds: array,
+    min_durations: array
+) -> tuple[array, array, array]:
+    # Each velocity sample is computed exactly as in _antisymmetric_fir and consumed on the spot by
+    # the squared error sum, the crossing counter and the streaming detector of the online engine
+    methods = coefficients.shape[0]
+    records, samples = data.shape
+    errors = zeros((methods, records))
+    crossings = zeros((methods, records), dtype=int64)
+    saccades = zeros((methods, records), dtype=int64)
+
+    for task in prange(methods * records):
+        method = task // records
+        record = task % records
+        radius = radii[method]
+        scale = denominators[method] * step
+        threshold = thresholds[record]
+        min_duration = min_durations[record]
+
+        error = 0.0
+        crossing_count = 0
+        saccade_count = 0
+        above = False
+        previous_boundary = False
+        run_start = 0
+        in_saccade = False
+        onset = 0
+        trigger = 0
+
+        for index in range(samples):
+            velocity = 0.0
+            if radius <= index < samples - radius:
+                for k in range(1, radius + 1):
+                    velocity += coefficients[method, k - 1] * (data[record, index + k] - data[record, index - k])
+                velocity = velocity / scale
+
+            difference = reference[record, index] - velocity
+            error += difference * difference
+            value = abs(velocity)
+
+            if value > threshold:
+                if not above:
+                    crossing_count += 1
+                above = True
+            else:
+                above = False
+
+            closed, previous_boundary, run_start, in_saccade, onset, trigger = _detector_step(
+                value, index, threshold, step, min_duration, previous_boundary, run_start, in_saccade, onset, trigger
+            )
+            if closed >= 0:
+                saccade_count += 1
+
+        if _detector_end(samples - 1, step, min_duration, in_saccade, onset, trigger):
+            saccade_count += 1
+
+        errors[method, record] = error / samples if samples > 0 else 0.0
+        crossings[method, record] = crossing_count
+        saccades[method, record] = saccade_count
+
+    return errors, crossings, saccades
+
+
+def differentiate_reduce(
+    data: array,
+    reference: array,
+    step: float,
+    methods: Iterable[Union[str, Differentiator]] = METHODS,
+    threshold: Union[float, array] = inf,
+    min_duration: Union[float, array] = 0.0
+) -> tuple[array, array, array]:
+    # (methods, records) mean squared errors against reference, upward |v| > threshold crossings and
+    # detect_saccades counts, without allocating any velocity array. Thresholds and minimum
+    # durations are scalars or one per record.
+    differentiators = [_differentiator(method) for method in methods]
+    data = ascontiguousarray(atleast_2d(data), dtype=float64)
+    reference = ascontiguousarray(atleast_2d(reference), dtype=float64)
+    records = data.shape[0]
+
+    return _differentiate_reduce(
+        data,
+        reference,
+        *_stencils(differentiators),
+        step,
+        full(records, threshold, dtype=float64),
+        full(records, min_duration, dtype=float64)
+    )
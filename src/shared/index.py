@@ -0,0 +1,143 @@
+import json
+from dataclasses import asdict, dataclass
+from os import replace, stat
+from os.path import basename, exists, join
+from typing import Iterable, Optional
+
+from .enums import Status
+from .io import MatlabFile, matlab_files
+
+
+INDEX_FILENAME = 'index.json'
+INDEX_VERSION = 2
+
+
+@dataclass
+class IndexEntry:
+    filename: str
+    size: int
+    mtime: float
+    name: str
+    angle: int
+    noise: float
+    h: float
+    status: Status
+    saccades_count: int
+    threshold: float
+    records: int
+
+    @classmethod
+    def from_file(cls, filename: str) -> 'IndexEntry':
+        info = stat(filename)
+        data = MatlabFile(filename)
+
+        return cls(
+            filename=basename(filename),
+            size=info.st_size,
+            mtime=info.st_mtime,
+            name=str(data.variable('nmFichero1')[0]),
+            angle=int(data.variable('aSc')[0][0]),
+            noise=float(filename.split('_')[-2]),
+            h=float(data.variable('tSm')[0][0]),
+            status=Status.from_matlab(data.variable('Cat')[0]),
+            saccades_count=int(data.variable('cnSc')[0][0]),
+            threshold=float(data.variable('vThr')[0][0]),
+            records=int(data.variable('cnRg')[0][0])
+        )
+
+    @classmethod
+    def from_json(cls, value: dict) -> 'IndexEntry':
+        return cls(**{**value, 'status': Status(value['status'])})
+
+    def to_json(self) -> dict:
+        return {**asdict(self), 'status': self.status.value}
+
+    def is_current(self, filename: str) -> bool:
+        info = stat(filename)
+        return info.st_size == self.size and info.st_mtime == self.mtime
+
+
+@dataclass(frozen=True)
+class RecordQuery:
+    # None accepts any value; every record of a file shares its metadata
+    angles: Optional[frozenset[int]] = None
+    statuses: Optional[frozenset[Status]] = None
+    noises: Optional[frozenset[float]] = None
+
+    def matches(self, entry: IndexEntry) -> bool:
+        return (
+            (self.angles is None or entry.angle in self.angles)
+            and (self.statuses is None or entry.status in self.statuses)
+            and (self.noises is None or entry.noise in self.noises)
+        )
+
+
+class DataIndex:
+    # Sidecar index of a .mat folder, entries are rebuilt only for new or modified files
+    def __init__(self, path: str, filename: str = INDEX_FILENAME):
+        self.path = path
+        self.filename = join(path, filename)
+        self.entries: dict[str, IndexEntry] = {}
+
+        if exists(self.filename):
+            with open(self.filename) as file:
+                data = json.load(file)
+            if data.get('version') == INDEX_VERSION:
+                self.entries = {
+                    entry['filename']: IndexEntry.from_json(entry)
+                    for entry in data['files']
+                }
+
+        if self.refresh():
+            self.save()
+
+    def refresh(self) -> bool:
+        changed = False
+        entries = {}
+        for filename in matlab_files(self.path):
+            entry = self.entries.get(basename(filename))
+            if entry is None or not entry.is_current(filename):
+                entry = IndexEntry.from_file(filename)
+                changed = True
+            entries[entry.filename] = entry
+
+        changed |= entries.keys() != self.entries.keys()
+        self.entries = entries
+        return changed
+
+    def save(self):
+        temporary = f'{self.filename}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({
+                'version': INDEX_VERSION,
+                'files': [entry.to_json() for entry in self.entries.values()],
+            }, file, indent=1)
+        replace(temporary, self.filename)
+
+    def query(self, query: Optional[RecordQuery] = None) -> list[IndexEntry]:
+        return [
+            entry
+            for entry in self.entries.values()
+            if query is None or query.matches(entry)
+        ]
+
+    def files(self, query: Optional[RecordQuery] = None) -> list[str]:
+        return [join(self.path, entry.filename) for entry in self.query(query)]
+
+    def records(self, query: Optional[RecordQuery] = None) -> int:
+        return sum(entry.records for entry in self.query(query))
+
+
+def record_query(
+    angles: Optional[Iterable[int]] = None,
+    statuses: Optional[Iterable[Status]] = None,
+    noises: Optional[Iterable[float]] = None
+) -> Optional[RecordQuery]:
+    if angles is None and statuses is None and noises is None:
+        return None
+
+    return RecordQuery(
+        angles=None if angles is None else frozenset(angles),
+        statuses=None if statuses is None else frozenset(statuses),
+        noises=None if noises is None else frozenset(noises)
+    )
@@ -1,37 +1,101 @@
 from typing import Iterable
 from os import listdir
-from os.path import join
+from os.path import basename, join
 
-from scipy.io import loadmat
+from numpy import array, empty
+from scipy.io import loadmat, savemat
 
-from .dataclasses import Record
+from .dataclasses import LazyRecord, Record
 from .enums import Status
 
 
-def read_matlab(filename: str) -> Iterable[Record]:
-    data = loadmat(filename)
+METADATA_VARIABLES = ('nmFichero1', 'aSc', 'tSm', 'Cat', 'cnSc', 'vThr', 'cnRg')
+SIGNAL_VARIABLES = {
+    'X': 'xS',
+    'Y': 'yS',
+    'V0': 'vS',
+    'Y0': 'y0S',
+}
+
+
+class MatlabFile:
+    # Variables of one .mat file, each decoded by loadmat the first time it is requested
+    def __init__(self, filename: str, variable_names: Iterable[str] = METADATA_VARIABLES):
+        self.filename = filename
+        self.variables = loadmat(filename, variable_names=list(variable_names))
+
+    def variable(self, name: str) -> array:
+        if name not in self.variables:
+            self.variables.update(loadmat(self.filename, variable_names=[name]))
+        return self.variables[name]
+
+    def signal(self, name: str, record: int) -> array:
+        return self.variable(SIGNAL_VARIABLES[name])[0][record].flatten()
+
+
+def read_matlab(filename: str, signals: Iterable[str] = tuple(SIGNAL_VARIABLES)) -> Iterable[Record]:
+    # Only the metadata and the selected signals are decoded up front, the rest on access
+    signals = list(signals)
+    data = MatlabFile(filename, METADATA_VARIABLES + tuple(SIGNAL_VARIABLES[signal] for signal in signals))
     noise = float(filename.split('_')[-2])
 
-    for record in range(int(data['cnRg'][0][0])):
-        yield Record(
-            filename=data['nmFichero1'][0],
-            angle=int(data['aSc'][0][0]),
+    for record in range(int(data.variable('cnRg')[0][0])):
+        fields = dict(
+            filename=data.variable('nmFichero1')[0],
+            angle=int(data.variable('aSc')[0][0]),
             noise=noise,
-            h=data['tSm'][0][0],
-            status=Status.from_matlab(data['Cat'][0]),
-            saccades_count=int(data['cnSc'][0][0]),
-            threshold=data['vThr'][0][0],
-            X=data['xS'][0][record].flatten(),
-            Y=data['yS'][0][record].flatten(),
-            V0=data['vS'][0][record].flatten(),
-            Y0=data['y0S'][0][record].flatten()
+            h=data.variable('tSm')[0][0],
+            status=Status.from_matlab(data.variable('Cat')[0]),
+            saccades_count=int(data.variable('cnSc')[0][0]),
+            threshold=data.variable('vThr')[0][0],
+            **{signal: data.signal(signal, record) for signal in signals}
         )
 
+        if len(signals) == len(SIGNAL_VARIABLES):
+            yield Record(index=record, **fields)
+        else:
+            yield LazyRecord(data, record, **fields)
+
+
+def write_matlab(filename: str, records: list[Record]):
+    # Inverse of read_matlab, every record must share the metadata of the first one
+    cells = {
+        variable: empty((1, len(records)), dtype=object)
+        for variable in SIGNAL_VARIABLES.values()
+    }
+    for index, record in enumerate(records):
+        for signal, variable in SIGNAL_VARIABLES.items():
+            cells[variable][0, index] = getattr(record, signal).reshape(-1, 1)
+
+    record = records[0]
+    savemat(filename, {
+        'nmFichero1': basename(filename),
+        'cnRg': len(records),
+        'aSc': record.angle,
+        'tSm': record.h,
+        'Cat': 'S' if record.status == Status.Healthy else 'E',
+        'cnSc': record.saccades_count,
+        'vThr': record.threshold,
+        **cells,
+    })
+
+
+def matlab_files(path: str) -> list[str]:
+    return [
+        join(path, filename)
+        for filename in listdir(path)
+        if filename.endswith('.mat')
+    ]
+
 
-def iterate_matlab_folder(path: str, verbose: bool = False) -> Iterable[Record]:
-    for filename in listdir(path):
-        if filename.endswith('.mat'):
-            yield from read_matlab(join(path, filename))
+def iterate_matlab_folder(
+    path: str,
+    verbose: bool = False,
+    signals: Iterable[str] = tuple(SIGNAL_VARIABLES)
+) -> Iterable[Record]:
+    signals = list(signals)
+    for filename in matlab_files(path):
+        yield from read_matlab(filename, signals)
 
-            if verbose:
-                print(f'{filename} completed')
+        if verbose:
+            print(f'{basename(filename)} completed')
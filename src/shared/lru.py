@@ -0,0 +1,138 @@
+from collections import OrderedDict
+from itertools import count
+from typing import Any, Callable, Hashable
+from weakref import finalize
+
+
+# Budget of the process-wide cache shared by every record
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def nbytes(value: Any) -> int:
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(item) for item in value)
+    return getattr(value, 'nbytes', 0)
+
+
+class SignalCache:
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+        self.misses += 1
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        size = nbytes(value)
+        self.discard(key)
+
+        if size > self.max_bytes:
+            return
+
+        while self.bytes + size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+        self._entries[key] = (value, size)
+        self.bytes += size
+
+    def discard(self, key: Hashable):
+        if key in self._entries:
+            _, size = self._entries.pop(key)
+            self.bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def scope(self) -> 'CacheScope':
+        return CacheScope(self)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class CacheScope:
+    # The entries of one record in a shared SignalCache, so that one byte budget bounds every record.
+    # Keys are prefixed with a never reused token and dropped once the scope is garbage collected.
+    _tokens = count()
+
+    def __init__(self, cache: SignalCache):
+        self.cache = cache
+        self.token = next(self._tokens)
+        self._keys = set()
+        finalize(self, _discard_keys, cache, self._keys)
+
+    @property
+    def max_bytes(self) -> int:
+        return self.cache.max_bytes
+
+    def __contains__(self, key: Hashable) -> bool:
+        return (self.token, key) in self.cache
+
+    def __len__(self) -> int:
+        return sum((self.token, key) in self.cache for key in self._keys)
+
+    def __reduce__(self):
+        # Entries stay in their process, a worker receiving a record starts an empty scope there
+        return shared_scope, ()
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        self._keys.add((self.token, key))
+        return self.cache.get((self.token, key), compute)
+
+    def put(self, key: Hashable, value: Any):
+        self._keys.add((self.token, key))
+        self.cache.put((self.token, key), value)
+
+    def discard(self, key: Hashable):
+        self._keys.discard((self.token, key))
+        self.cache.discard((self.token, key))
+
+    def clear(self):
+        _discard_keys(self.cache, self._keys)
+
+    def scope(self) -> 'CacheScope':
+        return CacheScope(self.cache)
+
+    def stats(self) -> dict[str, int]:
+        return self.cache.stats()
+
+
+def _discard_keys(cache: SignalCache, keys: set):
+    for key in keys:
+        cache.discard(key)
+    keys.clear()
+
+
+SIGNAL_CACHE = SignalCache()
+
+
+def shared_scope() -> CacheScope:
+    return SIGNAL_CACHE.scope()
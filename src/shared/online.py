@@ -0,0 +1,180 @@
+from typing import Union
+
+from numba import njit
+from numpy import array, empty, float64, int64, vstack, zeros
+
+from .differentiation import Differentiator, _differentiator
+from .saccades import _detector_end, _detector_step
+
+
+@njit
+def _differentiate_block(
+    samples: array,
+    window: array,
+    state: array,
+    coefficients: array,
+    scale: float,
+    out: array
+) -> int:
+    # state = [samples received, ring position]
+    radius = len(coefficients)
+    width = 2 * radius + 1
+    emitted = 0
+
+    for sample in samples:
+        position = state[1]
+        window[position] = sample
+        received = state[0]
+        state[0] = received + 1
+        state[1] = (position + 1) % width
+
+        # The newest sample completes the stencil centred `radius` samples ago
+        centre = received - radius
+        if centre < 0:
+            continue
+
+        value = 0.0
+        if centre >= radius:
+            middle = (position - radius) % width
+            for k in range(1, radius + 1):
+                value += coefficients[k - 1] * (window[(middle + k) % width] - window[(middle - k) % width])
+            value = value / scale
+
+        out[emitted] = value
+        emitted += 1
+
+    return emitted
+
+
+@njit
+def _detect_block(
+    velocities: array,
+    state: array,
+    threshold: float,
+    h: float,
+    min_duration: float,
+    out: array
+) -> int:
+    # state = [index, previous >= boundary, run start, in saccade, onset, trigger]
+    index = state[0]
+    previous_boundary = state[1] == 1
+    run_start = state[2]
+    in_saccade = state[3] == 1
+    onset = state[4]
+    trigger = state[5]
+    emitted = 0
+
+    for velocity in velocities:
+        closed, previous_boundary, run_start, in_saccade, onset, trigger = _detector_step(
+            abs(velocity), index, threshold, h, min_duration, previous_boundary, run_start, in_saccade, onset, trigger
+        )
+        if closed >= 0:
+            out[emitted, 0] = closed
+            out[emitted, 1] = index - 1
+            emitted += 1
+        index += 1
+
+    state[0] = index
+    state[1] = previous_boundary
+    state[2] = run_start
+    state[3] = in_saccade
+    state[4] = onset
+    state[5] = trigger
+    return emitted
+
+
+class OnlineDifferentiator:
+    # Emits the velocity of sample i once sample i + delay has been pushed, delay being the
+    # stencil half-width. The first and last `delay` outputs are zero, as in differentiate,
+    # so the concatenated push/flush output equals differentiate on the whole signal.
+    def __init__(self, method: Union[str, Differentiator], step: float):
+        differentiator = _differentiator(method)
+        self.delay = differentiator.radius
+        self._coefficients = array(differentiator.coefficients, dtype=float64)
+        self._scale = differentiator.denominator * step
+        self._window = zeros(2 * self.delay + 1)
+        self._state = zeros(2, dtype=int64)
+
+    @property
+    def received(self) -> int:
+        return int(self._state[0])
+
+    def push(self, samples: array) -> array:
+        out = empty(len(samples))
+        emitted = _differentiate_block(
+            samples.astype(float64, copy=False),
+            self._window,
+            self._state,
+            self._coefficients,
+            self._scale,
+            out
+        )
+        return out[:emitted]
+
+    def flush(self) -> array:
+        pending = min(self.delay, self.received)
+        self.reset()
+        return zeros(pending)
+
+    def reset(self):
+        self._window[:] = 0
+        self._state[:] = 0
+
+
+class OnlineSaccadeDetector:
+    # Incremental Record.saccades: an (onset, offset) row is emitted as soon as the first
+    # sample below the boundary velocity closes the saccade.
+    def __init__(self, threshold: float, h: float, min_duration: float):
+        self.threshold = threshold
+        self.h = h
+        self.min_duration = min_duration
+        self._state = zeros(6, dtype=int64)
+
+    def push(self, velocities: array) -> array:
+        out = empty((len(velocities), 2), dtype=int64)
+        emitted = _detect_block(
+            velocities.astype(float64, copy=False),
+            self._state,
+            self.threshold,
+            self.h,
+            self.min_duration,
+            out
+        )
+        return out[:emitted]
+
+    def flush(self) -> array:
+        index, _, _, in_saccade, onset, trigger = self._state.tolist()
+        last = index - 1
+        self.reset()
+
+        if _detector_end(last, self.h, self.min_duration, bool(in_saccade), onset, trigger):
+            return array([[onset, last]], dtype=int64)
+        return empty((0, 2), dtype=int64)
+
+    def reset(self):
+        self._state[:] = 0
+
+
+class OnlineEngine:
+    def __init__(
+        self,
+        method: Union[str, Differentiator],
+        step: float,
+        threshold: float,
+        min_duration: float
+    ):
+        self.differentiator = OnlineDifferentiator(method, step)
+        self.detector = OnlineSaccadeDetector(threshold, step, min_duration)
+
+    @property
+    def delay(self) -> int:
+        return self.differentiator.delay
+
+    def push(self, samples: array) -> tuple[array, array]:
+        velocities = self.differentiator.push(samples)
+        return velocities, self.detector.push(velocities)
+
+    def flush(self) -> tuple[array, array]:
+        velocities = self.differentiator.flush()
+        events = self.detector.push(velocities)
+        return velocities, vstack([events, self.detector.flush()])
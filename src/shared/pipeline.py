@@ -0,0 +1,256 @@
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from joblib import Parallel, delayed, effective_n_jobs
+from numpy import array, full, int8, int16
+
+from .dataclasses import DFBlock, Record
+from .differentiation import CENTRAL_DIFFERENCES, METHODS
+from .enums import Metric, Status
+from .io import matlab_files, read_matlab
+from .profiling import PROFILER
+from .shards import ShardStore, parameters_fingerprint
+from .store import iterate_store, store_size
+from .synthetic import synthetic_records
+
+
+EXACT_SACCADES_COLUMNS = ['Status', 'Angle', 'Noise', 'Duration', 'PeakVelocity']
+ALL_METRICS = frozenset(Metric)
+
+
+@dataclass
+class RecordResults:
+    filename: str
+    status: Status
+    angle: int
+    factor: int
+    saccades_count: int
+    blocks: dict[Metric, DFBlock] = field(default_factory=dict)
+    exact_saccades: dict[str, array] = field(default_factory=dict)
+
+
+def extract_record(
+    record: Record,
+    factors: Iterable[int] = (5,),
+    metrics: Iterable[Metric] = ALL_METRICS,
+    exact_saccades: bool = True,
+    engine: str = 'stencil'
+) -> list[RecordResults]:
+    return extract_records([record], factors, metrics, exact_saccades, engine)
+
+
+def extract_records(
+    records: Iterable[Record],
+    factors: Iterable[int] = (5,),
+    metrics: Iterable[Metric] = ALL_METRICS,
+    exact_saccades: bool = True,
+    engine: str = 'stencil'
+) -> list[RecordResults]:
+    metrics = frozenset(metrics)
+    factors = tuple(factors)
+    if any(factor < 1 for factor in factors):
+        raise ValueError(f'Downsampling factors must be positive integers, got {factors}')
+    with PROFILER.stage('load'):
+        records = list(records)
+    PROFILER.count('records', len(records))
+
+    downsampled = [
+        view
+        for record in records
+        for view in record.downsampled_cascade(factors).values()
+    ]
+
+    methods = [
+        method
+        for method in METHODS
+        if Metric.MSE in metrics or method not in CENTRAL_DIFFERENCES
+    ] if metrics else []
+    segmented = [
+        method
+        for method in methods
+        if method not in CENTRAL_DIFFERENCES
+    ] if metrics & {Metric.DetectedSaccades, Metric.Duration, Metric.Latency} else []
+    PROFILER.count('samples', sum(len(record.Y) for record in downsampled))
+
+    # Velocities that only feed the MSE and the detected saccade counts are reduced on the fly
+    reduced = [
+        method
+        for method in methods
+        if method in CENTRAL_DIFFERENCES or not metrics & {Metric.PeakVelocity, Metric.Duration, Metric.Latency}
+    ] if engine == 'stencil' else []
+    stacked = [method for method in methods if method not in reduced]
+
+    Record.reduce_metrics(downsampled, reduced, [method for method in segmented if method in reduced])
+    Record.precompute(downsampled, stacked, [method for method in segmented if method in stacked], engine)
+
+    return [
+        _collect_results(record, metrics, exact_saccades)
+        for record in downsampled
+    ]
+
+
+def _collect_results(
+    downsampled: Record,
+    metrics: frozenset[Metric],
+    exact_saccades: bool
+) -> RecordResults:
+    results = RecordResults(
+        filename=downsampled.filename,
+        status=downsampled.status,
+        angle=downsampled.angle,
+        factor=downsampled.factor,
+        saccades_count=downsampled.saccades_count
+    )
+
+    if exact_saccades:
+        reference = downsampled.reference_events()
+        count = len(reference)
+        results.exact_saccades = {
+            'Status': full(count, downsampled.status.value, dtype=int8),
+            'Angle': full(count, downsampled.angle, dtype=int16),
+            'Noise': full(count, downsampled.noise),
+            'Factor': full(count, downsampled.factor, dtype=int16),
+            'Duration': (reference['offset'] - reference['onset']) * downsampled.h,
+            'PeakVelocity': reference['peak_velocity'],
+        }
+
+    if Metric.MSE in metrics:
+        with PROFILER.stage('metrics/MSE'):
+            results.blocks[Metric.MSE] = DFBlock.from_lines(downsampled, Metric.MSE, downsampled.mse_lines())
+
+    if Metric.DetectedSaccades in metrics:
+        with PROFILER.stage('metrics/DetectedSaccades'):
+            results.blocks[Metric.DetectedSaccades] = DFBlock.from_lines(
+                downsampled,
+                Metric.DetectedSaccades,
+                downsampled.detected_saccades_lines()
+            )
+
+    if Metric.PeakVelocity in metrics:
+        with PROFILER.stage('metrics/PeakVelocity'):
+            results.blocks[Metric.PeakVelocity] = downsampled.peak_velocity_block()
+
+    time_metrics = metrics & {Metric.Duration, Metric.Latency}
+    if time_metrics:
+        with PROFILER.stage('metrics/Duration+Latency'):
+            blocks = downsampled.time_blocks()
+            for metric in time_metrics:
+                results.blocks[metric] = blocks[metric]
+
+    for block in results.blocks.values():
+        PROFILER.count(f'rows/{block.metric.name}', len(block))
+
+    return results
+
+
+def warm_kernels(factors: Iterable[int] = (5,), engine: str = 'stencil'):
+    # Compiles every numba kernel the extraction reaches by running it on one short synthetic record,
+    # so that a profiled run times the work of each stage and not the JIT of whichever stage came first
+    record = next(iter(synthetic_records(1, 20, Status.Healthy, 0.1, duration=1.0, saccades=2, seed=0)))
+    extract_records([record], factors, ALL_METRICS, True, engine)
+
+
+def extract_file(
+    filename: str,
+    factors: Iterable[int] = (5,),
+    metrics: Iterable[Metric] = ALL_METRICS,
+    exact_saccades: bool = True,
+    engine: str = 'stencil'
+) -> list[RecordResults]:
+    return extract_records(read_matlab(filename), factors, metrics, exact_saccades, engine)
+
+
+def extract_store_range(
+    path: str,
+    start: int,
+    stop: int,
+    factors: Iterable[int] = (5,),
+    metrics: Iterable[Metric] = ALL_METRICS,
+    exact_saccades: bool = True,
+    engine: str = 'stencil'
+) -> list[RecordResults]:
+    return extract_records(iterate_store(path, start, stop), factors, metrics, exact_saccades, engine)
+
+
+def extract_folder(
+    path: str,
+    factors: Iterable[int] = (5,),
+    metrics: Iterable[Metric] = ALL_METRICS,
+    exact_saccades: bool = True,
+    jobs: int = 1,
+    files: Optional[Iterable[str]] = None,
+    shards: Optional[ShardStore] = None,
+    engine: str = 'stencil'
+) -> Iterable[RecordResults]:
+    # With a shard store only new or changed files are extracted, the rest is read back
+    files = matlab_files(path) if files is None else list(files)
+    fingerprint = parameters_fingerprint(factors, metrics, exact_saccades, engine)
+    stale = [
+        filename
+        for filename in files
+        if shards is None or not shards.is_current(filename, fingerprint)
+    ]
+
+    tasks = [
+        delayed(extract_file)(filename, tuple(factors), frozenset(metrics), exact_saccades, engine)
+        for filename in stale
+    ]
+    blocks = _run_blocks(tasks, jobs)
+
+    stale = set(stale)
+    for filename in files:
+        if filename not in stale:
+            with PROFILER.stage('load/shards'):
+                block = shards.read(filename, fingerprint)
+            yield from block
+            continue
+
+        block = next(blocks)
+        if shards is not None:
+            with PROFILER.stage('serialize/shards'):
+                shards.write(filename, fingerprint, block)
+        yield from block
+
+
+def extract_store(
+    path: str,
+    factors: Iterable[int] = (5,),
+    metrics: Iterable[Metric] = ALL_METRICS,
+    exact_saccades: bool = True,
+    jobs: int = 1,
+    chunk_size: int = 64,
+    engine: str = 'stencil'
+) -> Iterable[RecordResults]:
+    size = store_size(path)
+    tasks = [
+        delayed(extract_store_range)(path, start, min(start + chunk_size, size), tuple(factors), frozenset(metrics), exact_saccades, engine)
+        for start in range(0, size, chunk_size)
+    ]
+    yield from _run_tasks(tasks, jobs)
+
+
+def _with_methods(methods: dict, function, args: tuple, kwargs: dict) -> list[RecordResults]:
+    # Workers import the built-in methods only, registered ones travel with every task
+    METHODS.update(methods)
+    return function(*args, **kwargs)
+
+
+def _run_blocks(tasks: list, jobs: int) -> Iterable[list[RecordResults]]:
+    if jobs == 1:
+        for function, args, kwargs in tasks:
+            yield function(*args, **kwargs)
+        return
+
+    batch_size = 2 * effective_n_jobs(jobs)
+    methods = dict(METHODS)
+    with Parallel(n_jobs=jobs) as parallel:
+        for start in range(0, len(tasks), batch_size):
+            yield from parallel(
+                delayed(_with_methods)(methods, *task)
+                for task in tasks[start:start + batch_size]
+            )
+
+
+def _run_tasks(tasks: list, jobs: int) -> Iterable[RecordResults]:
+    for block in _run_blocks(tasks, jobs):
+        yield from block
@@ -0,0 +1,158 @@
+import json
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+from os import getpid
+from sys import platform
+from threading import get_ident
+from time import perf_counter
+from typing import ContextManager
+
+from .lru import SIGNAL_CACHE
+
+
+_DISABLED_STAGE = nullcontext()
+
+
+def peak_rss() -> int:
+    # resource is Unix only, Windows reports no peak RSS.
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    if platform == 'win32':
+        return 0
+
+    from resource import RUSAGE_SELF, getrusage
+
+    usage = getrusage(RUSAGE_SELF).ru_maxrss
+    return usage if platform == 'darwin' else usage * 1024
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    seconds: float = 0.0
+    # Peak traced allocations above the level at stage entry, summed over calls
+    allocated: int = 0
+    peak_rss: int = 0
+
+
+class Profiler:
+    # Stage timers, counters and a Chrome trace of the extraction pipeline. Disabled by default,
+    # in which case stage() returns a shared no-op context manager.
+    def __init__(self):
+        self.enabled = False
+        self.stages: dict[str, StageStats] = defaultdict(StageStats)
+        self.counters: dict[str, int] = defaultdict(int)
+        self.events: list[dict] = []
+        self._stack: list[list[int]] = []
+        self._origin = perf_counter()
+        self._started = 0.0
+        self._cache_start: dict[str, int] = {}
+
+    def enable(self):
+        self.reset()
+        self.enabled = True
+        self._started = perf_counter()
+        self._cache_start = SIGNAL_CACHE.stats()
+        tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def reset(self):
+        self.stages.clear()
+        self.counters.clear()
+        self.events.clear()
+        self._stack.clear()
+
+    def stage(self, name: str) -> ContextManager:
+        if not self.enabled:
+            return _DISABLED_STAGE
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name: str):
+        # Nested stages keep the enclosing stage's running peak before resetting the traced peak
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            self._stack[-1][1] = max(self._stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._stack.append([current, current])
+        start = perf_counter()
+
+        try:
+            yield
+        finally:
+            end = perf_counter()
+            before, running_peak = self._stack.pop()
+            peak = max(running_peak, tracemalloc.get_traced_memory()[1])
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+
+            stats = self.stages[name]
+            stats.calls += 1
+            stats.seconds += end - start
+            stats.allocated += peak - before
+            stats.peak_rss = max(stats.peak_rss, peak_rss())
+
+            self.events.append({
+                'name': name,
+                'ph': 'X',
+                'ts': (start - self._origin) * 1e6,
+                'dur': (end - start) * 1e6,
+                'pid': getpid(),
+                'tid': get_ident(),
+                'args': {'allocated': peak - before},
+            })
+
+    def count(self, name: str, value: int = 1):
+        if self.enabled:
+            self.counters[name] += value
+
+    def cache_stats(self) -> dict[str, int]:
+        # SIGNAL_CACHE occupancy now and its hits, misses and evictions since enable()
+        stats = SIGNAL_CACHE.stats()
+        for name in ('hits', 'misses', 'evictions'):
+            stats[name] -= self._cache_start.get(name, 0)
+        return stats
+
+    def summary(self) -> str:
+        wall = perf_counter() - self._started
+        lines = [
+            f'{"Stage":<32} {"Calls":>8} {"Total s":>10} {"Mean ms":>10} {"Wall %":>8} {"Alloc MiB":>10} {"RSS MiB":>9}'
+        ]
+        for name, stats in sorted(self.stages.items(), key=lambda item: -item[1].seconds):
+            lines.append(
+                f'{name:<32} {stats.calls:>8} {stats.seconds:>10.3f} {stats.seconds / stats.calls * 1000:>10.3f} '
+                f'{stats.seconds / wall * 100:>8.1f} {stats.allocated / 2 ** 20:>10.1f} {stats.peak_rss / 2 ** 20:>9.1f}'
+            )
+
+        lines.append('')
+        lines.extend(f'{name:<32} {value:>12}' for name, value in sorted(self.counters.items()))
+        lines.append('')
+        cache = self.cache_stats()
+        lookups = cache['hits'] + cache['misses']
+        lines.append(
+            f'Signal cache: {cache["hits"]} hits, {cache["misses"]} misses '
+            f'({cache["hits"] / lookups * 100 if lookups else 0:.1f}% hit rate), {cache["evictions"]} evictions, '
+            f'{cache["entries"]} entries, {cache["bytes"] / 2 ** 20:.1f} of {cache["max_bytes"] / 2 ** 20:.0f} MiB'
+        )
+        lines.append(f'Wall time: {wall:.3f} s, peak RSS: {peak_rss() / 2 ** 20:.1f} MiB')
+        return '\n'.join(lines)
+
+    def save(self, path: str):
+        # Chrome trace event format, loadable in chrome://tracing or Perfetto, plus the summary
+        with open(path, 'w') as file:
+            json.dump({
+                'traceEvents': self.events,
+                'stages': {name: asdict(stats) for name, stats in self.stages.items()},
+                'counters': dict(self.counters),
+                'signal_cache': self.cache_stats(),
+                'wall_seconds': perf_counter() - self._started,
+                'peak_rss': peak_rss(),
+            }, file)
+
+
+PROFILER = Profiler()
@@ -0,0 +1,108 @@
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from numpy import array, concatenate, int32, unique
+from pandas import Categorical, DataFrame, HDFStore, Series
+
+from .enums import Metric
+
+
+METRIC_KEYS = {
+    Metric.MSE: 'mse',
+    Metric.DetectedSaccades: 'detected_saccades',
+    Metric.PeakVelocity: 'peak_velocities',
+    Metric.Duration: 'durations',
+    Metric.Latency: 'latencies',
+}
+EXACT_SACCADES_KEY = 'exact_saccades'
+CATEGORICAL_COLUMNS = ('Filename', 'Method')
+
+
+class ResultsWriter:
+    # Appends column chunks to an HDF5 file, buffering at most chunk_rows rows per table.
+    # Categorical columns are stored as int32 codes, their categories are written on close.
+    def __init__(
+        self,
+        path: str,
+        chunk_rows: int = 1 << 16,
+        categorical: Iterable[str] = CATEGORICAL_COLUMNS,
+        complevel: int = 5
+    ):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.rows = defaultdict(int)
+        self._store = HDFStore(path, mode='w', complevel=complevel, complib='blosc')
+        self._categories = {column: {} for column in categorical}
+        self._buffers = defaultdict(list)
+        self._buffered = defaultdict(int)
+
+    def __enter__(self) -> 'ResultsWriter':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _encode(self, column: str, values: array) -> array:
+        categories = self._categories[column]
+        uniques, inverse = unique(values, return_inverse=True)
+        codes = array([
+            categories.setdefault(value, len(categories))
+            for value in uniques.tolist()
+        ], dtype=int32)
+        return codes[inverse.reshape(-1)]
+
+    def append(self, key: str, columns: dict[str, array]):
+        count = len(next(iter(columns.values()), []))
+        if count == 0:
+            return
+
+        self._buffers[key].append({
+            column: self._encode(column, values) if column in self._categories else values
+            for column, values in columns.items()
+        })
+        self._buffered[key] += count
+
+        if self._buffered[key] >= self.chunk_rows:
+            self.flush(key)
+
+    def flush(self, key: Optional[str] = None):
+        for current in [key] if key is not None else list(self._buffers):
+            chunks = self._buffers.pop(current, [])
+            if not chunks:
+                continue
+
+            frame = DataFrame({
+                column: concatenate([chunk[column] for chunk in chunks])
+                for column in chunks[0]
+            })
+            self._store.append(current, frame, format='table', index=False)
+            self.rows[current] += len(frame)
+            self._buffered[current] = 0
+
+    def close(self):
+        if not self._store.is_open:
+            return
+
+        self.flush()
+        for column, categories in self._categories.items():
+            if categories:
+                self._store.put(f'categories/{column}', Series(list(categories), dtype=object))
+        self._store.close()
+
+
+def read_results(path: str, key: str) -> DataFrame:
+    with HDFStore(path, mode='r') as store:
+        df = store.get(key)
+        for column in CATEGORICAL_COLUMNS:
+            if column in df.columns:
+                categories = store.get(f'categories/{column}')
+                df[column] = Categorical.from_codes(df[column], categories=categories.values)
+
+    return df
+
+
+def columns_dataframe(chunks: list[dict[str, array]], columns: list[str]) -> DataFrame:
+    return DataFrame({
+        column: concatenate([chunk[column] for chunk in chunks]) if chunks else []
+        for column in columns
+    })
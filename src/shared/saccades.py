@@ -0,0 +1,187 @@
+from typing import Union
+
+from numba import njit, prange
+from numpy import array, bincount, dtype, empty, flatnonzero, float64, full, int64, searchsorted, zeros
+
+
+MIN_DURATIONS = {
+    20: 0.09,
+    30: 0.115,
+    60: 0.175,
+}
+
+# Saccades are widened from the threshold crossing while |v| stays above this value
+BOUNDARY_VELOCITY = 20
+
+SACCADE_DTYPE = dtype([
+    ('onset', int64),
+    ('offset', int64),
+    ('peak', int64),
+    ('peak_velocity', float64),
+    ('amplitude', float64),
+])
+
+
+@njit
+def _segment(velocities: array, threshold: float, h: float, min_duration: float, out: array) -> int:
+    last = len(velocities) - 1
+    index = 0
+    count = 0
+
+    while index < last:
+        if abs(velocities[index]) > threshold:
+            onset = index
+            while onset > 0 and abs(velocities[onset - 1]) >= BOUNDARY_VELOCITY:
+                onset -= 1
+            offset = index
+            while offset < last and abs(velocities[offset + 1]) >= BOUNDARY_VELOCITY:
+                offset += 1
+
+            if (offset - onset) * h >= min_duration:
+                if count < out.shape[0]:
+                    out[count, 0] = onset
+                    out[count, 1] = offset
+                count += 1
+
+            index = offset + 1
+        else:
+            index += 1
+
+    return count
+
+
+@njit
+def _detector_step(
+    value: float,
+    index: int,
+    threshold: float,
+    h: float,
+    min_duration: float,
+    previous_boundary: bool,
+    run_start: int,
+    in_saccade: bool,
+    onset: int,
+    trigger: int
+) -> tuple[int, bool, int, bool, int, int]:
+    # One |velocity| sample of the streaming form of _segment. Returns the onset of the saccade the
+    # sample closes at offset index - 1, or -1, followed by the updated detector state.
+    closed = -1
+    if in_saccade and value < BOUNDARY_VELOCITY:
+        if (index - 1 - onset) * h >= min_duration:
+            closed = onset
+        in_saccade = False
+
+    if not in_saccade and value > threshold:
+        onset = run_start if previous_boundary else index
+        trigger = index
+        in_saccade = True
+
+    if value >= BOUNDARY_VELOCITY:
+        if not previous_boundary:
+            run_start = index
+        previous_boundary = True
+    else:
+        previous_boundary = False
+
+    return closed, previous_boundary, run_start, in_saccade, onset, trigger
+
+
+@njit
+def _detector_end(last: int, h: float, min_duration: float, in_saccade: bool, onset: int, trigger: int) -> bool:
+    # Whether the saccade still open at the last sample is kept. A crossing on the very last sample
+    # never starts a saccade in the batch detector.
+    return in_saccade and trigger < last and (last - onset) * h >= min_duration
+
+
+@njit
+def _detect(velocities: array, threshold: float, h: float, min_duration: float) -> array:
+    out = empty((len(velocities), 2), dtype=int64)
+    count = _segment(velocities, threshold, h, min_duration, out)
+    return out[:count].copy()
+
+
+@njit(parallel=True)
+def _detect_batch(velocities: array, thresholds: array, steps: array, min_durations: array) -> tuple[array, array]:
+    rows = velocities.shape[0]
+    bounds = zeros(rows + 1, dtype=int64)
+    empty_out = empty((0, 2), dtype=int64)
+
+    for row in prange(rows):
+        bounds[row + 1] = _segment(velocities[row], thresholds[row], steps[row], min_durations[row], empty_out)
+
+    for row in range(rows):
+        bounds[row + 1] += bounds[row]
+
+    saccades = empty((bounds[rows], 2), dtype=int64)
+    for row in prange(rows):
+        _segment(velocities[row], thresholds[row], steps[row], min_durations[row], saccades[bounds[row]:bounds[row + 1]])
+
+    return saccades, bounds
+
+
+def detect_saccades(velocities: array, threshold: float, h: float, min_duration: float) -> array:
+    return _detect(velocities.astype(float64, copy=False), float(threshold), float(h), float(min_duration))
+
+
+def detect_saccades_batch(
+    velocities: array,
+    threshold: Union[float, array],
+    h: Union[float, array],
+    min_duration: Union[float, array]
+) -> tuple[array, array]:
+    rows = velocities.shape[0]
+    return _detect_batch(
+        velocities.astype(float64, copy=False),
+        full(rows, threshold, dtype=float64),
+        full(rows, h, dtype=float64),
+        full(rows, min_duration, dtype=float64)
+    )
+
+
+@njit
+def _segment_peaks(saccades: array, velocities: array) -> tuple[array, array]:
+    count = saccades.shape[0]
+    peaks = empty(count, dtype=int64)
+    peak_velocities = empty(count, dtype=float64)
+
+    for index in range(count):
+        onset, offset = saccades[index, 0], saccades[index, 1]
+        peak = onset
+        peak_velocity = abs(velocities[onset])
+        for sample in range(onset + 1, offset):
+            value = abs(velocities[sample])
+            if value > peak_velocity:
+                peak = sample
+                peak_velocity = value
+        peaks[index] = peak
+        peak_velocities[index] = peak_velocity
+
+    return peaks, peak_velocities
+
+
+def saccade_table(saccades: array, velocities: array, positions: array) -> array:
+    # The peak is searched in [onset, offset), the same span used by the peak velocity metric
+    saccades = saccades.reshape(-1, 2)
+    table = empty(len(saccades), dtype=SACCADE_DTYPE)
+    table['onset'] = saccades[:, 0]
+    table['offset'] = saccades[:, 1]
+    table['peak'], table['peak_velocity'] = _segment_peaks(saccades, velocities.astype(float64, copy=False))
+    table['amplitude'] = abs(positions[table['offset']] - positions[table['onset']])
+    return table
+
+
+def pair_saccades(reference: array, detected: array) -> tuple[array, array]:
+    # Each detected saccade is assigned to the first reference saccade it overlaps, and only
+    # references with exactly one assigned detection are paired. The reference table must be
+    # sorted and non-overlapping, as produced by detect_saccades.
+    candidates = searchsorted(reference['offset'], detected['onset'], side='left')
+    overlapping = candidates < len(reference)
+    overlapping[overlapping] = reference['onset'][candidates[overlapping]] <= detected['offset'][overlapping]
+
+    assigned = candidates[overlapping]
+    counts = bincount(assigned, minlength=len(reference))
+    matches = full(len(reference), -1, dtype=int64)
+    matches[assigned] = flatnonzero(overlapping)
+
+    reference_indices = flatnonzero(counts == 1)
+    return reference_indices, matches[reference_indices]
@@ -0,0 +1,117 @@
+import json
+import pickle
+from hashlib import blake2b
+from os import makedirs, remove, replace, stat
+from os.path import basename, exists, join, splitext
+from typing import Iterable
+
+from .differentiation import METHODS
+from .enums import Metric
+from .saccades import BOUNDARY_VELOCITY, MIN_DURATIONS
+
+
+MANIFEST_FILENAME = 'manifest.json'
+# Shards kept per file content, one per parameters fingerprint, the least recently written go first
+MAX_FINGERPRINTS = 8
+# Bump whenever RecordResults or the metric definitions change
+SHARD_VERSION = 2
+
+
+def content_hash(filename: str, block_size: int = 1 << 20) -> str:
+    digest = blake2b(digest_size=16)
+    with open(filename, 'rb') as file:
+        while block := file.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parameters_fingerprint(
+    factors: Iterable[int],
+    metrics: Iterable[Metric],
+    exact_saccades: bool,
+    engine: str = 'stencil'
+) -> str:
+    parameters = {
+        'version': SHARD_VERSION,
+        'methods': {
+            method: [list(differentiator.coefficients), differentiator.denominator]
+            for method, differentiator in METHODS.items()
+        },
+        'factors': list(factors),
+        'metrics': sorted(metric.name for metric in metrics),
+        'exact_saccades': exact_saccades,
+        'engine': engine,
+        'min_durations': MIN_DURATIONS,
+        'boundary_velocity': BOUNDARY_VELOCITY,
+    }
+    return blake2b(json.dumps(parameters, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+
+def _write_atomic(filename: str, write):
+    temporary = f'{filename}.tmp'
+    with open(temporary, 'wb') as file:
+        write(file)
+    replace(temporary, filename)
+
+
+class ShardStore:
+    # Per-file extraction results keyed by the file content hash and the parameters fingerprint.
+    # The manifest is rewritten after every shard, so an interrupted run keeps finished files.
+    # With rebuild every file is extracted again and its shard overwritten.
+    def __init__(self, path: str, rebuild: bool = False):
+        self.path = path
+        self.rebuild = rebuild
+        self.filename = join(path, MANIFEST_FILENAME)
+        self.files: dict[str, dict] = {}
+
+        makedirs(path, exist_ok=True)
+        if exists(self.filename):
+            with open(self.filename) as file:
+                self.files = json.load(file)['files']
+
+    def _entry(self, filename: str) -> dict:
+        # Hashes are only recomputed when the size or mtime differ from the manifest
+        info = stat(filename)
+        entry = self.files.get(basename(filename))
+        if entry is not None and entry['size'] == info.st_size and entry['mtime'] == info.st_mtime:
+            return entry
+
+        digest = content_hash(filename)
+        if entry is None or entry['hash'] != digest:
+            if entry is not None:
+                for shard in entry['shards'].values():
+                    self._remove(shard)
+            entry = {'hash': digest, 'shards': {}}
+
+        entry.update(size=info.st_size, mtime=info.st_mtime)
+        self.files[basename(filename)] = entry
+        return entry
+
+    def _remove(self, shard: str):
+        if exists(join(self.path, shard)):
+            remove(join(self.path, shard))
+
+    def is_current(self, filename: str, fingerprint: str) -> bool:
+        if self.rebuild:
+            return False
+        shard = self._entry(filename)['shards'].get(fingerprint)
+        return shard is not None and exists(join(self.path, shard))
+
+    def read(self, filename: str, fingerprint: str) -> list:
+        with open(join(self.path, self._entry(filename)['shards'][fingerprint]), 'rb') as file:
+            return pickle.load(file)
+
+    def write(self, filename: str, fingerprint: str, results: list):
+        entry = self._entry(filename)
+        shard = f'{splitext(basename(filename))[0]}-{entry["hash"][:12]}-{fingerprint}.pkl'
+        _write_atomic(join(self.path, shard), lambda file: pickle.dump(results, file, pickle.HIGHEST_PROTOCOL))
+
+        shards = entry['shards']
+        shards.pop(fingerprint, None)
+        shards[fingerprint] = shard
+        while len(shards) > MAX_FINGERPRINTS:
+            self._remove(shards.pop(next(iter(shards))))
+        self.save()
+
+    def save(self):
+        _write_atomic(self.filename, lambda file: file.write(json.dumps({'files': self.files}, indent=1).encode()))
@@ -0,0 +1,231 @@
+from itertools import combinations
+from typing import Iterable, Optional
+
+from joblib import Parallel, delayed
+from numpy import (
+    arange,
+    argsort,
+    array,
+    asarray,
+    bincount,
+    concatenate,
+    empty,
+    errstate,
+    flatnonzero,
+    full,
+    isnan,
+    maximum,
+    minimum,
+    nan,
+    nanquantile,
+)
+from numpy.random import SeedSequence, default_rng
+from pandas import DataFrame
+from scipy.stats import f as f_distribution, friedmanchisquare, rankdata, wilcoxon
+
+
+# Rows sharing these columns belong to the same file and downsampling factor
+OBSERVATION_COLUMNS = ('Filename', 'Factor')
+# Rows sharing these columns belong to the same record
+RECORD_COLUMNS = OBSERVATION_COLUMNS + ('Record',)
+# Rows sharing these columns are the same observation: one record, and for per-saccade metrics one
+# reference saccade of it
+KEY_COLUMNS = RECORD_COLUMNS + ('Saccade',)
+CORRECTIONS = ('holm', 'bonferroni', 'fdr_bh', 'none')
+
+
+def method_matrix(
+    df: DataFrame,
+    value: str,
+    observation: Iterable[str] = KEY_COLUMNS,
+    complete: bool = True
+) -> DataFrame:
+    # Pivots a metric table into an (observation x method) matrix on the key columns present in df.
+    # Rows still sharing a key are numbered in emission order, which only pairs them when every
+    # method emitted the same number of them, e.g. tables written before the Record and Saccade keys.
+    keys = [column for column in observation if column in df.columns]
+    methods = list(df['Method'].unique())
+    data = df[keys + ['Method', value]]
+
+    counts = data.groupby(keys + ['Method'], observed=True, sort=False).size().unstack('Method')
+    if (counts.nunique(axis=1) > 1).any():
+        raise ValueError(
+            f'Methods emitted different numbers of {value} rows per {keys}, '
+            f'their rows cannot be paired without the Record and Saccade keys'
+        )
+
+    position = data.groupby(keys + ['Method'], observed=True, sort=False).cumcount().rename('Observation')
+    matrix = data.set_index(keys + ['Method', position])[value].unstack('Method')[methods]
+    matrix.columns = [str(method) for method in methods]
+    return matrix.dropna() if complete else matrix
+
+
+def adjust_pvalues(pvalues: array, correction: str = 'holm') -> array:
+    pvalues = asarray(pvalues, dtype=float)
+    adjusted = full(len(pvalues), nan)
+    valid = flatnonzero(~isnan(pvalues))
+    count = len(valid)
+    if correction == 'none' or count == 0:
+        return pvalues.copy()
+
+    order = valid[argsort(pvalues[valid])]
+    ordered = pvalues[order]
+    if correction == 'bonferroni':
+        adjusted[order] = ordered * count
+    elif correction == 'holm':
+        adjusted[order] = maximum.accumulate(ordered * (count - arange(count)))
+    elif correction == 'fdr_bh':
+        scaled = ordered * count / arange(1, count + 1)
+        adjusted[order] = minimum.accumulate(scaled[::-1])[::-1]
+    else:
+        raise ValueError(f'Unknown correction "{correction}", expected one of {CORRECTIONS}')
+
+    return minimum(adjusted, 1)
+
+
+def friedman_test(matrix: DataFrame) -> DataFrame:
+    # Chi-square statistic with tie correction, Kendall's W and the Iman-Davenport F approximation
+    count, methods = matrix.shape
+    statistic, pvalue = friedmanchisquare(*matrix.to_numpy().T)
+    w = statistic / (count * (methods - 1))
+    ddof1 = methods - 1 - 2 / count
+    ddof2 = (count - 1) * ddof1
+    f = (count - 1) * w / (1 - w)
+
+    return DataFrame([{
+        'n': count,
+        'k': methods,
+        'Q': statistic,
+        'p-chisq': pvalue,
+        'W': w,
+        'F': f,
+        'ddof1': ddof1,
+        'ddof2': ddof2,
+        'p-F': f_distribution.sf(f, ddof1, ddof2),
+    }])
+
+
+def _wilcoxon_chunk(first: array, second: array) -> tuple[array, array]:
+    result = wilcoxon(first, second, axis=0, nan_policy='omit')
+    return result.statistic, result.pvalue
+
+
+def pairwise_wilcoxon(
+    matrix: DataFrame,
+    correction: str = 'holm',
+    alpha: float = 0.05,
+    jobs: int = 1,
+    chunk_size: int = 32
+) -> DataFrame:
+    # Every method pair is tested from the same matrix, chunks of pairs run as one vectorized call
+    values = matrix.to_numpy()
+    pairs = array(list(combinations(range(values.shape[1]), 2))).reshape(-1, 2)
+    chunks = [pairs[start:start + chunk_size] for start in range(0, len(pairs), chunk_size)]
+
+    tasks = [
+        delayed(_wilcoxon_chunk)(values[:, chunk[:, 0]], values[:, chunk[:, 1]])
+        for chunk in chunks
+    ]
+    if jobs == 1:
+        results = [function(*args, **kwargs) for function, args, kwargs in tasks]
+    else:
+        results = Parallel(n_jobs=jobs)(tasks)
+
+    statistics = concatenate([statistic for statistic, _ in results]) if results else empty(0)
+    pvalues = concatenate([pvalue for _, pvalue in results]) if results else empty(0)
+    differences = values[:, pairs[:, 0]] - values[:, pairs[:, 1]]
+    corrected = adjust_pvalues(pvalues, correction)
+    columns = list(matrix.columns)
+
+    return DataFrame({
+        'A': [columns[index] for index in pairs[:, 0]],
+        'B': [columns[index] for index in pairs[:, 1]],
+        'n': (~isnan(differences)).sum(axis=0),
+        'W-val': statistics,
+        'p-unc': pvalues,
+        'p-corr': corrected,
+        'different': corrected <= alpha,
+    })
+
+
+def block_means(df: DataFrame, value: str, blocks: Iterable[str]) -> DataFrame:
+    # (block x method) matrix of mean values, the pivot pingouin's friedman does on its subject column
+    methods = [str(method) for method in df['Method'].unique()]
+    means = df.groupby(list(blocks) + [df['Method'].astype(str)], observed=True)[value].mean()
+    return means.unstack('Method')[methods].dropna()
+
+
+def metric_tests(
+    df: DataFrame,
+    value: str,
+    correction: str = 'holm',
+    alpha: float = 0.05,
+    jobs: int = 1,
+    blocks: Optional[Iterable[str]] = None
+) -> tuple[DataFrame, DataFrame]:
+    # Friedman on the signed errors, pairwise Wilcoxon on their absolute values. By default every paired
+    # record or saccade is a Friedman block, so n and the p-values differ from the analysis notebook,
+    # whose friedman(subject='Filename') blocks on per-file means; blocks=('Filename',) reproduces it.
+    matrix = method_matrix(df, value)
+    blocked = matrix if blocks is None else block_means(df, value, blocks)
+    return friedman_test(blocked), pairwise_wilcoxon(matrix.abs(), correction, alpha, jobs)
+
+
+def _bootstrap_means(sums: array, counts: array, resamples: int, seed: SeedSequence) -> array:
+    # Each resample draws clusters with replacement; its weights are the draw multiplicities
+    clusters = sums.shape[0]
+    draws = default_rng(seed).integers(0, clusters, (resamples, clusters))
+    draws += arange(resamples)[:, None] * clusters
+    weights = bincount(draws.ravel(), minlength=resamples * clusters).reshape(resamples, clusters)
+    with errstate(invalid='ignore', divide='ignore'):
+        return (weights @ sums) / (weights @ counts)
+
+
+def bootstrap_ranking(
+    df: DataFrame,
+    value: str,
+    resamples: int = 10_000,
+    alpha: float = 0.05,
+    clusters: Iterable[str] = RECORD_COLUMNS,
+    absolute: bool = True,
+    seed: Optional[int] = None,
+    jobs: int = 1,
+    chunk_size: int = 1_000
+) -> DataFrame:
+    # Confidence intervals of each method's mean error and rank. Whole records are resampled with all
+    # their saccades; tables without the Record column fall back to resampling whole files.
+    keys = [column for column in clusters if column in df.columns]
+    methods = [str(method) for method in df['Method'].unique()]
+    values = df[value].abs() if absolute else df[value]
+    grouped = values.groupby([df[key] for key in keys] + [df['Method'].astype(str)], observed=True)
+    sums = grouped.sum().unstack('Method', fill_value=0)[methods].to_numpy()
+    counts = grouped.count().unstack('Method', fill_value=0)[methods].to_numpy()
+
+    seeds = SeedSequence(seed).spawn((resamples + chunk_size - 1) // chunk_size)
+    tasks = [
+        delayed(_bootstrap_means)(sums, counts, min(chunk_size, resamples - index * chunk_size), chunk_seed)
+        for index, chunk_seed in enumerate(seeds)
+    ]
+    if jobs == 1:
+        chunks = [function(*args, **kwargs) for function, args, kwargs in tasks]
+    else:
+        chunks = Parallel(n_jobs=jobs)(tasks)
+
+    means = concatenate(chunks)
+    ranks = rankdata(means, axis=1)
+    estimate = sums.sum(axis=0) / counts.sum(axis=0)
+    quantiles = [alpha / 2, 1 - alpha / 2]
+    mean_low, mean_high = nanquantile(means, quantiles, axis=0)
+    rank_low, rank_high = nanquantile(ranks, quantiles, axis=0)
+
+    return DataFrame({
+        'Method': methods,
+        'Mean': estimate,
+        'MeanLow': mean_low,
+        'MeanHigh': mean_high,
+        'Rank': rankdata(estimate),
+        'RankLow': rank_low,
+        'RankHigh': rank_high,
+        'MeanRank': ranks.mean(axis=0),
+        'Best': (ranks == 1).mean(axis=0),
+    }).sort_values('Mean', ignore_index=True)
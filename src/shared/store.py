@@ -0,0 +1,102 @@
+from os import makedirs
+from os.path import join
+from typing import Iterable, Optional
+
+from numpy import array, cumsum, float64, int64, load, memmap, save, zeros
+
+from .dataclasses import Record
+from .enums import Status
+
+
+SIGNALS = ('X', 'Y', 'V0', 'Y0')
+
+
+def metadata_dtype(filename_length: int) -> list[tuple[str, str]]:
+    return [
+        ('filename', f'U{filename_length}'),
+        ('angle', 'i8'),
+        ('noise', 'f8'),
+        ('h', 'f8'),
+        ('status', 'i1'),
+        ('saccades_count', 'i8'),
+        ('threshold', 'f8'),
+    ]
+
+
+def write_store(records: Iterable[Record], path: str) -> int:
+    makedirs(path, exist_ok=True)
+
+    metadata = []
+    lengths = []
+    signals = {
+        signal: open(join(path, f'{signal}.f8'), 'wb')
+        for signal in SIGNALS
+    }
+
+    try:
+        for record in records:
+            length = len(record.Y)
+            for signal, output in signals.items():
+                values = getattr(record, signal)
+                if len(values) != length:
+                    raise ValueError(f'Signal {signal} of "{record.filename}" has {len(values)} samples, expected {length}')
+                values.astype(float64, copy=False).tofile(output)
+
+            lengths.append(length)
+            metadata.append((
+                str(record.filename),
+                record.angle,
+                record.noise,
+                record.h,
+                record.status.value,
+                record.saccades_count,
+                record.threshold,
+            ))
+    finally:
+        for output in signals.values():
+            output.close()
+
+    offsets = zeros(len(lengths) + 1, dtype=int64)
+    offsets[1:] = cumsum(lengths)
+
+    filename_length = max((len(row[0]) for row in metadata), default=1)
+    save(join(path, 'offsets.npy'), offsets)
+    save(join(path, 'metadata.npy'), array(metadata, dtype=metadata_dtype(filename_length)))
+
+    return len(metadata)
+
+
+def store_size(path: str) -> int:
+    return len(load(join(path, 'metadata.npy')))
+
+
+def iterate_store(path: str, start: int = 0, stop: Optional[int] = None) -> Iterable[Record]:
+    metadata = load(join(path, 'metadata.npy'))
+    offsets = load(join(path, 'offsets.npy'))
+
+    if offsets[-1] == 0:
+        return
+
+    signals = {
+        signal: memmap(join(path, f'{signal}.f8'), dtype=float64, mode='r')
+        for signal in SIGNALS
+    }
+
+    for index in range(start, len(metadata) if stop is None else stop):
+        row = metadata[index]
+        begin, end = offsets[index], offsets[index + 1]
+
+        yield Record(
+            filename=str(row['filename']),
+            angle=int(row['angle']),
+            noise=float(row['noise']),
+            h=float(row['h']),
+            status=Status(row['status']),
+            saccades_count=int(row['saccades_count']),
+            threshold=float(row['threshold']),
+            X=signals['X'][begin:end],
+            Y=signals['Y'][begin:end],
+            V0=signals['V0'][begin:end],
+            Y0=signals['Y0'][begin:end],
+            index=index
+        )
@@ -0,0 +1,167 @@
+from os import makedirs
+from os.path import join
+from typing import Iterable, Optional, Union
+
+from numpy import arange, array, clip, full, maximum, sqrt, zeros
+from numpy.random import Generator, SeedSequence, default_rng
+
+from .dataclasses import Record
+from .enums import Status
+from .io import write_matlab
+from .saccades import BOUNDARY_VELOCITY, MIN_DURATIONS
+from .store import write_store
+
+
+# Main sequence: duration = MAIN_SEQUENCE_INTERCEPT + MAIN_SEQUENCE_SLOPE * amplitude, calibrated so the
+# span above the boundary velocity of healthy saccades clears MIN_DURATIONS like the simulated dataset
+MAIN_SEQUENCE_INTERCEPT = 0.07
+MAIN_SEQUENCE_SLOPE = 0.0025
+# Jittered saccades are lengthened until their span above the boundary velocity clears MIN_DURATIONS by
+# this much, on top of the two samples the span can lose to sampling
+DURATION_MARGIN = 0.01
+# SCA2 saccades keep their amplitude but are markedly slower
+SICK_SLOWDOWN = 1.8
+AMPLITUDE_JITTER = 0.05
+DURATION_JITTER = 0.05
+DEFAULT_THRESHOLD = 30.0
+# Records generated at once, bounds the (records, samples) temporaries
+BATCH_SIZE = 64
+
+
+def saccade_duration(amplitude: array, status: Status) -> array:
+    duration = MAIN_SEQUENCE_INTERCEPT + MAIN_SEQUENCE_SLOPE * amplitude
+    return duration * SICK_SLOWDOWN if status == Status.Sick else duration
+
+
+def shortest_duration(amplitude: array, span: float) -> array:
+    # A minimum jerk saccade of duration D stays above the boundary velocity for
+    # D * sqrt(1 - 4 sqrt(BOUNDARY_VELOCITY * D / (30 * amplitude))), increasing in D up to well past
+    # any main sequence duration. The fixed point iteration converges in a few steps from D = span.
+    duration = full(array(amplitude).shape, span)
+    for _ in range(20):
+        duration = span / sqrt(1 - 4 * sqrt(BOUNDARY_VELOCITY * duration / (30 * amplitude)))
+    return duration
+
+
+def synthetic_signals(
+    count: int,
+    samples: int,
+    h: float,
+    angle: int,
+    status: Status,
+    noise: float,
+    saccades: int,
+    rng: Generator
+) -> tuple[array, array, array]:
+    # Minimum jerk saccades alternating between -angle/2 and angle/2, one per time slot.
+    # Returns the noisy positions, the exact velocities and the exact positions, each (count, samples).
+    t = arange(samples) * h
+    slot = samples * h / saccades
+    amplitudes = angle * (1 + AMPLITUDE_JITTER * rng.standard_normal((count, saccades)))
+    durations = saccade_duration(amplitudes, status) * (1 + DURATION_JITTER * rng.standard_normal((count, saccades)))
+    span = MIN_DURATIONS.get(angle, 0.0) + DURATION_MARGIN + 2 * h
+    durations = clip(maximum(durations, shortest_duration(amplitudes, span)), 2 * h, 0.8 * slot)
+    onsets = slot * arange(saccades) + rng.uniform(0.1, 0.9, (count, saccades)) * (slot - durations)
+
+    Y0 = full((count, samples), -angle / 2)
+    V0 = zeros((count, samples))
+    for index in range(saccades):
+        sign = 1 if index % 2 == 0 else -1
+        tau = clip((t - onsets[:, index, None]) / durations[:, index, None], 0, 1)
+        amplitude = sign * amplitudes[:, index, None]
+        Y0 += amplitude * tau ** 3 * (10 - 15 * tau + 6 * tau ** 2)
+        V0 += amplitude * 30 * tau ** 2 * (1 - tau) ** 2 / durations[:, index, None]
+
+    return Y0 + noise * rng.standard_normal((count, samples)), V0, Y0
+
+
+def synthetic_records(
+    count: int,
+    angle: int,
+    status: Status,
+    noise: float,
+    h: float = 0.001,
+    duration: float = 6.0,
+    saccades: int = 5,
+    threshold: float = DEFAULT_THRESHOLD,
+    filename: str = 'synthetic.mat',
+    seed: Union[int, SeedSequence, None] = None
+) -> Iterable[Record]:
+    rng = default_rng(seed)
+    samples = int(round(duration / h))
+    X = arange(samples) * h
+
+    for start in range(0, count, BATCH_SIZE):
+        Y, V0, Y0 = synthetic_signals(min(BATCH_SIZE, count - start), samples, h, angle, status, noise, saccades, rng)
+        for index in range(len(Y)):
+            yield Record(
+                filename=filename,
+                angle=angle,
+                noise=noise,
+                h=h,
+                status=status,
+                saccades_count=saccades,
+                threshold=threshold,
+                X=X,
+                Y=Y[index],
+                V0=V0[index],
+                Y0=Y0[index],
+                index=start + index
+            )
+
+
+def synthetic_filename(angle: int, status: Status, noise: float, h: float, part: int = 0) -> str:
+    # read_matlab takes the noise level from the second to last underscore separated field
+    name = 'Sano' if status == Status.Healthy else 'Enfermo'
+    return f'RegScSimul{angle}_{int(round(1 / h))}_part{part}_allNoisesDC_{noise}_{name}.mat'
+
+
+def generate_dataset(
+    path: str,
+    records_per_file: int = 4,
+    files_per_condition: int = 1,
+    angles: Iterable[int] = tuple(MIN_DURATIONS),
+    statuses: Iterable[Status] = tuple(Status),
+    noises: Iterable[float] = (0.1, 0.5),
+    h: float = 0.001,
+    duration: float = 6.0,
+    saccades: int = 5,
+    seed: Optional[int] = None,
+    store: bool = False
+) -> int:
+    # Writes one .mat file per condition and part, or every record straight into a record store
+    conditions = [
+        (angle, status, noise, part)
+        for angle in angles
+        for status in statuses
+        for noise in noises
+        for part in range(files_per_condition)
+    ]
+    seeds = SeedSequence(seed).spawn(len(conditions))
+
+    def records(angle: int, status: Status, noise: float, part: int, seed: SeedSequence) -> Iterable[Record]:
+        return synthetic_records(
+            records_per_file,
+            angle,
+            status,
+            noise,
+            h,
+            duration,
+            saccades,
+            filename=synthetic_filename(angle, status, noise, h, part),
+            seed=seed
+        )
+
+    if store:
+        return write_store((
+            record
+            for condition, seed in zip(conditions, seeds)
+            for record in records(*condition, seed)
+        ), path)
+
+    makedirs(path, exist_ok=True)
+    for condition, seed in zip(conditions, seeds):
+        filename = synthetic_filename(*condition[:3], h, condition[3])
+        write_matlab(join(path, filename), list(records(*condition, seed)))
+
+    return len(conditions) * records_per_file
@@ -0,0 +1,39 @@
+#!/bin/env python3.9
+from time import perf_counter
+
+from numpy import array_equal, concatenate, vstack
+
+from shared import OnlineEngine, differentiate, read_matlab
+
+BLOCK_SIZE = 16
+
+if __name__ == '__main__':
+    records = list(read_matlab('../data/RegScSimul20_1000_allNoisesDC_0.5_Sano.mat'))
+
+    for method in ('sl9', 'snr11'):
+        for rec in records:
+            engine = OnlineEngine(method, rec.h, rec.threshold, rec.min_duration)
+            # Compile the kernels outside of the timed loop
+            engine.push(rec.Y[:BLOCK_SIZE])
+            engine.flush()
+
+            velocities, events = [], []
+            start = perf_counter()
+            for index in range(0, len(rec.Y), BLOCK_SIZE):
+                block_velocities, block_events = engine.push(rec.Y[index:index + BLOCK_SIZE])
+                velocities.append(block_velocities)
+                events.append(block_events)
+            elapsed = perf_counter() - start
+
+            tail_velocities, tail_events = engine.flush()
+            velocities = concatenate(velocities + [tail_velocities])
+            events = vstack(events + [tail_events])
+
+            expected = differentiate(rec.Y, rec.h, method)
+            assert array_equal(velocities, expected)
+            assert array_equal(events, rec.saccades(expected))
+
+        print(f'Method: {method}')
+        print(f'Delay: {engine.delay} samples ({engine.delay * rec.h * 1000:.1f} ms)')
+        print(f'Per-sample latency: {elapsed / len(rec.Y) * 1e6:.3f} us')
+        print(f'Saccades: {len(events)}')
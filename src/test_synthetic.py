@@ -0,0 +1,15 @@
+#!/bin/env python3.9
+from shared import Status
+from shared.saccades import MIN_DURATIONS
+from shared.synthetic import synthetic_records
+
+RECORDS = 200
+
+if __name__ == '__main__':
+    for angle in MIN_DURATIONS:
+        for noise in (0.1, 0.5):
+            for seed in range(3):
+                for rec in synthetic_records(RECORDS, angle, Status.Healthy, noise, seed=seed):
+                    assert len(rec.reference_events()) == rec.saccades_count, (angle, noise, seed, rec.index)
+
+            print(f'Angle: {angle}, Noise: {noise}: {3 * RECORDS} healthy records match saccades_count')